@@ -0,0 +1,57 @@
+"""
+Optional NumPy backend
+
+NumPy is only imported the first time an implementation actually needs it, and
+the outcome is cached, so importing any algorithms module stays cheap and nothing
+is re-resolved in hot paths. If NumPy is missing, this is logged once (rather than
+printed) and pure-Python implementations are used wherever they exist.
+
+Functions offering both implementations take a :backend: argument:
+    None: NumPy if it is installed, otherwise pure Python
+    'numpy': NumPy, raising ImportError if it is not installed
+    'python': pure Python, even if NumPy is installed
+"""
+PYTHON = 'python'
+NUMPY = 'numpy'
+
+_numpy = None
+_resolved = False
+
+
+def get_numpy():
+    """ Return the numpy module, or None if it isn't installed """
+    global _numpy, _resolved
+    if not _resolved:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            import logging  # Only paid for when there is something to report
+            logging.getLogger(__name__).warning(
+                'numpy not detected in environment. '
+                'Falling back to pure-Python implementations where available')
+        _resolved = True
+    return _numpy
+
+
+def numpy_available() -> bool:
+    return get_numpy() is not None
+
+
+def require_numpy():
+    """ Return the numpy module, for implementations that cannot run without it """
+    np = get_numpy()
+    if np is None:
+        raise ImportError('numpy is required for this implementation')
+    return np
+
+
+def resolve(backend: str = None) -> str:
+    """ Resolve a :backend: argument to either PYTHON or NUMPY """
+    if backend is None:
+        return NUMPY if numpy_available() else PYTHON
+    if backend == NUMPY:
+        require_numpy()
+    elif backend != PYTHON:
+        raise ValueError(f'backend {backend!r} is not recognized.')
+    return backend
@@ -0,0 +1,254 @@
+"""
+Persistent, content-addressed cache for results of expensive solver calls
+
+Results are keyed on a stable hash of (function name, version, arguments) and live
+in a sqlite database on local disk, so they survive process restarts and can be
+shared between the workers of a multiprocessing pool. For example:
+
+```
+from algorithms import edit_distance
+from algorithms.disk_cache import DiskCache
+
+cache = DiskCache('results.sqlite', max_bytes=2**30)
+levenshtein = cache.memoize(version=1)(edit_distance.levenshtein_wagner_fischer)
+
+
+@cache.memoize(version=1)
+def min_cost_path(costs, allow_diagonal_move=True):
+    return MinCostPath(costs, allow_diagonal_move).solve_dp()
+```
+
+Bump :version: whenever the implementation changes, which invalidates old entries
+without having to delete the database.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import struct
+import time
+import zlib
+from functools import wraps
+
+_MISSING = object()
+
+
+def _encode(obj, h):
+    # Feed a tagged, unambiguous byte representation of obj into the hash. Python's
+    # builtin hash() is salted per process, so it cannot be used for on-disk keys
+    if obj is None:
+        h.update(b'N')
+    elif isinstance(obj, bool):  # Must come before int, since bool subclasses int
+        h.update(b'B1' if obj else b'B0')
+    elif isinstance(obj, int):
+        h.update(b'I%d;' % obj)
+    elif isinstance(obj, float):
+        h.update(b'F' + struct.pack('<d', obj))
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        h.update(b'S%d;' % len(data))
+        h.update(data)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        data = bytes(obj)
+        h.update(b'Y%d;' % len(data))
+        h.update(data)
+    elif isinstance(obj, (tuple, list)):
+        h.update(b'%s%d;' % (b'T' if isinstance(obj, tuple) else b'L', len(obj)))
+        for item in obj:
+            _encode(item, h)
+    elif isinstance(obj, dict):
+        # Dict ordering is not semantically meaningful, so sort on encoded keys
+        items = sorted((_digest(k), k, v) for k, v in obj.items())
+        h.update(b'D%d;' % len(items))
+        for _, k, v in items:
+            _encode(k, h)
+            _encode(v, h)
+    elif hasattr(obj, 'dtype') and hasattr(obj, 'tobytes'):
+        # NumPy arrays and scalars. Duck-typed so numpy need not be imported here;
+        # tobytes() always returns C-ordered data, even for non-contiguous views
+        h.update(b'A' + obj.dtype.str.encode() + repr(obj.shape).encode())
+        if obj.dtype.hasobject:
+            # The raw bytes would be pointers, so encode the elements themselves
+            _encode(obj.tolist(), h)
+        else:
+            h.update(obj.tobytes())
+    else:
+        raise TypeError(f'Cannot build a stable cache key for type {type(obj).__name__}')
+
+
+def _digest(obj) -> str:
+    h = hashlib.sha256()
+    _encode(obj, h)
+    return h.hexdigest()
+
+
+def make_key(name: str, version, args: tuple = (), kwargs: dict = None) -> str:
+    """ Stable hex digest of a call, identical across processes and machines """
+    return _digest((name, version, tuple(args), kwargs or {}))
+
+
+class DiskCache:
+    """ Size-bounded, sqlite-backed result store
+
+    Values are pickled and zlib-compressed. Once the total stored size exceeds
+    :max_bytes:, the least recently accessed entries are evicted.
+
+    Every process lazily opens its own connection (sqlite connections must not be
+    shared across a fork), and the database runs in WAL mode so readers never block
+    on writers. Writes use BEGIN IMMEDIATE and wait up to :timeout: seconds for the
+    lock, which makes it safe to use from many pool workers at once.
+
+    Cache hits do not write: their access times are queued in memory, and written in
+    one batch by the next set (before it evicts) or once _FLUSH_EVERY are pending.
+    An entry's access time is only bumped if it is more than :access_granularity:
+    seconds old, so LRU order is exact up to that granularity, and up to the hits
+    other processes have not flushed yet.
+    """
+    # Pending access times written in one transaction, even without a set
+    _FLUSH_EVERY = 256
+
+    def __init__(self, path, max_bytes: int = None, timeout: float = 30.0,
+                 access_granularity: float = 60.0):
+        self.path = os.fspath(path)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.access_granularity = access_granularity
+
+        self._conn = None
+        self._pid = None
+        self._pending = {}  # key: access time not written yet
+
+    def __getstate__(self):
+        # Connections cannot be pickled; workers reconnect on first use
+        state = self.__dict__.copy()
+        state['_conn'] = state['_pid'] = None
+        state['_pending'] = {}
+        return state
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def __contains__(self, key: str):
+        row = self._connection().execute(
+            'SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone()
+        return row is not None
+
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                '  key TEXT PRIMARY KEY,'
+                '  value BLOB NOT NULL,'
+                '  size INTEGER NOT NULL,'
+                '  accessed REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+
+    def get(self, key: str, default=None):
+        """ Return value stored under :key:, or :default: if absent """
+        conn = self._connection()
+        row = conn.execute('SELECT value, accessed FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return default
+        # Bumping the access time is what makes eviction LRU rather than FIFO. It is
+        # queued rather than written, so reads never take the write lock
+        now = time.time()
+        if now - max(row[1], self._pending.get(key, 0.0)) > self.access_granularity:
+            self._pending[key] = now
+            if len(self._pending) >= self._FLUSH_EVERY:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._flush_accesses(conn)
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                conn.execute('COMMIT')
+        return pickle.loads(zlib.decompress(row[0]))
+
+
+    def set(self, key: str, value):
+        """ Store :value: under :key:, evicting old entries if over budget """
+        blob = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)',
+                (key, blob, len(blob), time.time()),
+            )
+            self._flush_accesses(conn)
+            if self.max_bytes is not None:
+                self._evict(conn)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+
+    def _flush_accesses(self, conn):
+        # Write the queued access times, inside the caller's transaction
+        if self._pending:
+            conn.executemany('UPDATE entries SET accessed = ? WHERE key = ?',
+                             [(accessed, key) for key, accessed in self._pending.items()])
+            self._pending.clear()
+
+
+    def _evict(self, conn):
+        # Runs inside the writer's transaction, so concurrent writers cannot both
+        # evict against a stale total
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute('SELECT key, size FROM entries ORDER BY accessed ASC')
+        to_delete = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            total -= size
+        conn.executemany('DELETE FROM entries WHERE key = ?', to_delete)
+
+
+    def total_bytes(self) -> int:
+        """ Compressed size of all stored values """
+        return self._connection().execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+
+    def clear(self):
+        self._connection().execute('DELETE FROM entries')
+
+
+    def memoize(self, version=0, name: str = None):
+        """ Decorator caching a function's results on disk
+
+        :name: defaults to the function's fully qualified name. Arguments must be
+        built from None, bool, int, float, str, bytes, tuple, list, dict, or NumPy
+        arrays; anything else raises TypeError rather than risk a wrong hit.
+        """
+        def decorator(fn):
+            fn_name = name or f'{fn.__module__}.{fn.__qualname__}'
+
+            @wraps(fn)
+            def wrapped(*args, **kwargs):
+                key = make_key(fn_name, version, args, kwargs)
+                result = self.get(key, _MISSING)
+                if result is _MISSING:
+                    result = fn(*args, **kwargs)
+                    self.set(key, result)
+                return result
+
+            wrapped.cache = self
+            return wrapped
+
+        return decorator
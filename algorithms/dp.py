@@ -3,6 +3,10 @@ Dynamic programming problems
 """
 # TODO: write tests for these modules
 import sys
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+from algorithms.backend import PYTHON, require_numpy, resolve
 
 
 class MaximumSumNonOverlappingArray:
@@ -31,7 +35,8 @@ class MaximumSumNonOverlappingArray:
 
 
     def optimized(self):
-        # Optimized O(n) solution
+        # Optimized solution, O(n * k) since every window is still re-summed
+        # (see prefix_sum for a true O(n) solution)
         # Keep same short-circuiting conditions:
         if self.n == 2 * self.k:
             return sum(self.array)
@@ -60,6 +65,104 @@ class MaximumSumNonOverlappingArray:
         return max_sum
 
 
+    def _window_sums(self) -> list:
+        # Sum of the window starting at every i, via prefix sums: O(n) instead of O(n * k)
+        prefix = list(accumulate(self.array, initial=0))
+        return [prefix[i + self.k] - prefix[i] for i in range(self.n - self.k + 1)]
+
+
+    def prefix_sum(self):
+        # True O(n) solution, same contract as base and optimized
+        max_sum, _ = self.windows(2)
+        return max_sum
+
+
+    def windows(self, m: int = 2) -> tuple:
+        """ Generalize to m non-overlapping windows in O(n * m)
+
+        Let best[t][i] be the max sum of t windows fitting in array[:i]. Either the
+        t-th window ends exactly at i, or it doesn't and we inherit best[t][i-1]:
+
+            best[t][i] = max(best[t][i-1], best[t-1][i-k] + window_sum[i-k])
+
+        Returns (max sum, window offsets) or (None, []) if m windows don't fit
+        """
+        k, n = self.k, self.n
+        if n < m * k:
+            return None, []
+
+        window_sums = self._window_sums()
+        prev = [0] * (n + 1)  # best[0][i] = 0: zero windows always fit
+        took = []  # took[t-1][i] records whether best[t][i] closes a window at i
+        for t in range(1, m + 1):
+            cur = [-sys.maxsize] * (n + 1)
+            take = bytearray(n + 1)
+            for i in range(t * k, n + 1):  # Fewer than t*k elements can't fit t windows
+                with_window = prev[i - k] + window_sums[i - k]
+                if i == t * k or with_window > cur[i - 1]:
+                    cur[i] = with_window
+                    take[i] = 1
+                else:
+                    cur[i] = cur[i - 1]
+            took.append(take)
+            prev = cur
+
+        # Walk back from the full array: skip positions inheriting from the left, and
+        # jump over a window wherever one was closed
+        offsets = []
+        i = n
+        for t in reversed(range(m)):
+            while not took[t][i]:
+                i -= 1
+            i -= k
+            offsets.append(i)
+        offsets.reverse()
+        return prev[n], offsets
+
+
+    def vectorized(self, m: int = 2) -> tuple:
+        """ NumPy version of windows, meant for very large arrays
+
+        The recurrence in windows is a running max over
+        g[i] = best[t-1][i-k] + window_sum[i-k], so each layer is a single
+        np.maximum.accumulate. Memory is O(n * m) since layers are kept for recovering
+        the offsets. Integer input is accumulated in int64 to avoid overflow
+        """
+        np = require_numpy()
+
+        k, n = self.k, self.n
+        if n < m * k:
+            return None, []
+
+        array = np.asarray(self.array)
+        if array.dtype.kind in 'biu':
+            dtype, floor = np.int64, np.iinfo(np.int64).min // 2  # Room to add to floor
+        else:
+            dtype, floor = np.float64, -np.inf
+
+        prefix = np.zeros(n + 1, dtype=dtype)
+        np.cumsum(array, dtype=dtype, out=prefix[1:])
+        window_sums = prefix[k:] - prefix[:-k]
+        del prefix
+
+        layers = [np.zeros(n + 1, dtype=dtype)]
+        for t in range(1, m + 1):
+            g = np.full(n + 1, floor, dtype=dtype)
+            np.add(layers[-1][t * k - k : n - k + 1], window_sums[t * k - k :], out=g[t * k :])
+            layers.append(np.maximum.accumulate(g, out=g))
+
+        # The t-th window can start at any s where it attains the optimum of its layer
+        offsets = []
+        i = n
+        for t in range(m, 0, -1):
+            lo = (t - 1) * k
+            candidates = layers[t - 1][lo : i - k + 1] + window_sums[lo : i - k + 1]
+            i = lo + int(np.argmax(candidates == layers[t][i]))
+            offsets.append(i)
+        offsets.reverse()
+        return layers[m][n].item(), offsets
+
+
 def minimum_cost_of_reducing_array(array: list) -> int:
     """ Given an array A, the merge operation is defined between adjacent elements
     (A[i], A[i+1]) costs A[i] + A[i+1] and subsitutes the pair with the sum
@@ -68,8 +171,8 @@ def minimum_cost_of_reducing_array(array: list) -> int:
 
     Note: greedy approach will **not** work!
     """
-    # Naive solution uses recursion
-    # TODO: figure out solution in non-exponential time!
+    # Naive solution uses recursion, which takes factorial time.
+    # See minimum_cost_of_reducing_array_fast for polynomial-time solutions
     n = len(array)
     if n == 2:
         return array[0] + array[1]
@@ -87,12 +190,183 @@ def minimum_cost_of_reducing_array(array: list) -> int:
     return best_split_cost
 
 
+def _depths_from_splits(splits: list, n: int) -> list:
+    # Depth of each leaf in the merge tree encoded by an interval DP split table
+    depths = [0] * n
+    stack = [(0, n - 1, 0)]
+    while stack:
+        i, j, depth = stack.pop()
+        if i == j:
+            depths[i] = depth
+            continue
+        s = splits[i][j]
+        stack.append((i, s, depth + 1))
+        stack.append((s + 1, j, depth + 1))
+    return depths
+
+
+def _interval_dp(array: list, knuth: bool) -> list:
+    """ cost[i][j] = min over splits s of cost[i][s] + cost[s+1][j] + sum(array[i:j+1])
+
+    The last merge of array[i:j+1] always costs the full interval sum no matter the
+    split, which prefix sums give in O(1). Trying every split is O(n^3) overall.
+
+    Since interval sums satisfy the quadrangle inequality, the optimal split is
+    monotone: opt[i][j-1] <= opt[i][j] <= opt[i+1][j] (Knuth's optimization).
+    Summed over each diagonal, the search ranges telescope to O(n), so O(n^2) overall
+    """
+    n = len(array)
+    prefix = list(accumulate(array, initial=0))
+    cost = [[0] * n for _ in range(n)]
+    splits = [[i] * n for i in range(n)]
+
+    for length in range(2, n + 1):
+        for i in range(n - length + 1):
+            j = i + length - 1
+            if knuth:
+                lo, hi = splits[i][j-1], min(splits[i+1][j], j - 1)
+            else:
+                lo, hi = i, j - 1
+            row_i = cost[i]
+            best_cost, best_split = sys.maxsize, lo
+            for s in range(lo, hi + 1):
+                c = row_i[s] + cost[s+1][j]
+                if c < best_cost:
+                    best_cost, best_split = c, s
+            cost[i][j] = best_cost + prefix[j+1] - prefix[i]
+            splits[i][j] = best_split
+    return _depths_from_splits(splits, n)
+
+
+def _reinsertion_point(weights: list, end: int, weight) -> int:
+    # Index just after the last element of weights[:end] that is >= weight.
+    # The stack is "2-descending" (weights[i-2] > weights[i]), so the even and odd
+    # positions each form a strictly decreasing run, and each can be bisected
+    # instead of scanning left one element at a time
+    j = 0
+    for parity in (0, 1):
+        count = (end - parity + 1) // 2
+        # Number of leading entries of this parity that are >= weight
+        n_larger = bisect_left(range(count), True, key=lambda t: weights[parity + 2*t] < weight)
+        if n_larger:
+            j = max(j, parity + 2 * (n_larger - 1) + 1)
+    return j
+
+
+def _garsia_wachs(array: list) -> list:
+    """ Garsia-Wachs: combine a "locally minimal" pair, then reinsert the merged
+    weight further left, after the nearest element at least as large
+
+    The resulting tree is *not* in the original order, but the depth of every leaf
+    is optimal, and an order-preserving tree with those same depths always exists.
+
+    This is the stack-based formulation, where merges only happen near the top of
+    a stack kept "2-descending", and the reinsertion point is found by bisection in
+    O(log n). Reinsertion itself shifts list entries, which is O(n) in the worst
+    case but a fast memmove in practice
+    """
+    weights = []
+    nodes = []  # Leaf index, or (left, right) tuple for merged subtrees
+
+    def combine(k):
+        # Merge stack entries k-1 and k. Rather than recursing for the cascade of
+        # follow-up merges, remember each pending cascade by its distance from the top
+        resume = []
+        while True:
+            weight = weights[k-1] + weights[k]
+            node = (nodes[k-1], nodes[k])
+            del weights[k-1:k+1]
+            del nodes[k-1:k+1]
+
+            j = _reinsertion_point(weights, k - 1, weight)
+            weights.insert(j, weight)
+            nodes.insert(j, node)
+
+            while True:
+                if j >= 2 and weights[j] >= weights[j-2]:
+                    resume.append(len(weights) - j)
+                    k = j - 1
+                    break
+                if not resume:
+                    return
+                j = len(weights) - resume.pop()
+
+    for i, weight in enumerate(array):
+        weights.append(weight)
+        nodes.append(i)
+        while len(weights) >= 3 and weights[-3] <= weights[-1]:
+            combine(len(weights) - 2)
+    while len(weights) > 1:
+        combine(len(weights) - 1)
+
+    depths = [0] * len(array)
+    stack = [(nodes[0], 0)]
+    while stack:
+        node, depth = stack.pop()
+        if isinstance(node, tuple):
+            stack.append((node[0], depth + 1))
+            stack.append((node[1], depth + 1))
+        else:
+            depths[node] = depth
+    return depths
+
+
+def _merge_order_from_depths(depths: list) -> list:
+    # Rebuild the order-preserving tree with the given leaf depths. Pushing leaves
+    # left to right, the top two entries are siblings whenever their depths match.
+    # Everything on the stack has been merged already, so the left sibling's index
+    # in the partially-reduced array is just its position on the stack
+    order = []
+    stack = []
+    for depth in depths:
+        stack.append(depth)
+        while len(stack) >= 2 and stack[-1] == stack[-2]:
+            stack.pop()
+            stack[-1] -= 1
+            order.append(len(stack) - 1)
+    return order
+
+
+def minimum_cost_of_reducing_array_fast(array: list, method: str = 'garsia_wachs',
+                                        return_merge_order: bool = False):
+    """ Polynomial-time solutions to minimum_cost_of_reducing_array
+
+    Every way of reducing the array is a binary tree over its elements (in order),
+    and each element is added into the cost once per merge above it. So the cost is
+    sum(array[i] * depth[i]), i.e. an optimal alphabetic tree problem
+
+    :method: one of
+        'interval': interval DP over prefix sums, O(n^3) time and O(n^2) memory
+        'knuth': interval DP with Knuth's optimization, O(n^2)
+        'garsia_wachs': Garsia-Wachs, practical for 10^5+ elements (assumes
+            non-negative values, like the problem statement)
+
+    If :return_merge_order:, also return the list of merges, where i means merging
+    elements i and i+1 of the array *as it is at that point*
+    """
+    n = len(array)
+    if n <= 1:
+        depths = [0] * n
+    elif method == 'interval':
+        depths = _interval_dp(array, knuth=False)
+    elif method == 'knuth':
+        depths = _interval_dp(array, knuth=True)
+    elif method == 'garsia_wachs':
+        depths = _garsia_wachs(array)
+    else:
+        raise ValueError(f'method {method!r} is not recognized.')
+
+    cost = sum(value * depth for value, depth in zip(array, depths))
+    if return_merge_order:
+        return cost, _merge_order_from_depths(depths)
+    return cost
+
+
 def minimum_removals_to_diff_condition(array: list, k: int):
     """ Determine the minimum number of elements to remove from array such that
     the max difference between remaining elements <= k
     """
     # O(n log n) solution: sort then iteratively remove
-    n = len(array)  # Assume array is sorted for now
     # array = sorted(array)  # O(n log n)
 
     # # Base case:
@@ -106,38 +380,147 @@ def minimum_removals_to_diff_condition(array: list, k: int):
 
 
     # The recursive technique's drawback is that it repeatedly computes diffs.
-    # We can do this in O(n):
-    print([f'{i:02d}' for i in range(n)])
-    print([f'{i:02d}' for i in array])
-    j = 0
-    largest_array_size = -1
-    for i in range(n):
-        while array[j] - array[i] <= k and j < n - 1:
-            j += 1
-        print(f'For {i=}, largest {j=}. Array size={j - i - 1}')
-        largest_array_size = max(largest_array_size, j - i + 1)
-        # Find largest index that satisfies the condition
-    return n - largest_array_size + 1
+    # Once sorted, the kept elements are a contiguous window, and the largest
+    # window can be found in O(n) with two pointers (see DiffConditionIndex)
+    return DiffConditionIndex(array).query(k)
+
+
+class DiffConditionIndex:
+    """ Answer minimum_removals_to_diff_condition for many k over the same array
+
+    The array is sorted once. The answer for k is n minus the largest window whose
+    spread (last - first, once sorted) is <= k
+    """
+    def __init__(self, array: list):
+        self.values = sorted(array)
+        self.n = len(self.values)
+        self._array = None  # NumPy copy of values, built on first use
+        # _min_spread[L-1] is the smallest spread among windows of size L. It is
+        # nondecreasing in L, and is extended lazily, only as far as queries need
+        self._min_spread = [0] if self.n else []
+
+
+    def longest_windows(self, k) -> list:
+        """ Size of the longest valid window starting at each left pointer, O(n) """
+        values, n = self.values, self.n
+        sizes = [0] * n
+        j = 0
+        for i in range(n):
+            # The right pointer never moves back: if values[i:j] fits, so does values[i+1:j]
+            while j < n and values[j] - values[i] <= k:
+                j += 1
+            sizes[i] = j - i
+        return sizes
+
+
+    def query(self, k, backend: str = None) -> int:
+        """ Single query, as one vectorized two-pointer pass
+
+        For every left pointer the right pointer is found with np.searchsorted,
+        which performs all the pointer advances in C
+        """
+        if self.n == 0:
+            return 0
+        if resolve(backend) == PYTHON:
+            return self.n - max(max(self.longest_windows(k)), 0)
+
+        np = require_numpy()
+        if self._array is None:
+            self._array = np.asarray(self.values)
+        right = np.searchsorted(self._array, self._array + k, side='right')
+        return self.n - max(int((right - np.arange(self.n)).max()), 0)
+
+
+    def _extend_min_spread(self, k, budget: int, backend: str = None):
+        # Compute spreads for ever larger windows, until they exceed k, the whole
+        # array fits, or budget more sizes were added. Each window size costs one
+        # (vectorized) O(n) pass
+        n = self.n
+        stop = min(n, len(self._min_spread) + budget)
+        if resolve(backend) == PYTHON:
+            values = self.values
+            while len(self._min_spread) < stop and self._min_spread[-1] <= k:
+                size = len(self._min_spread) + 1
+                self._min_spread.append(min(values[i+size-1] - values[i] for i in range(n-size+1)))
+            return
+
+        np = require_numpy()
+        if self._array is None:
+            self._array = np.asarray(self.values)
+        values = self._array
+        while len(self._min_spread) < stop and self._min_spread[-1] <= k:
+            size = len(self._min_spread) + 1
+            self._min_spread.append((values[size-1:] - values[:n-size+1]).min().item())
+
+
+    def query_many(self, ks: list, backend: str = None) -> list:
+        """ Answer a batch of k values
+
+        Once the spread table reaches past k, a query is a bisection, O(log n). But
+        the table costs one O(n) pass per window size, so a large k would cost O(n**2)
+        to reach. A batch therefore only extends the table by as many sizes as one
+        direct pass per distinct k would cost, and answers the k beyond it directly:
+        with 'numpy', all of them at once, with one searchsorted of every left
+        pointer per k, in blocks.
+
+        So a batch costs O(q log n) once the table covers it. Otherwise each of the
+        d distinct k beyond the table costs O(n log n) ('numpy'; O(n) for 'python'),
+        i.e. O(q log n + d n log n) overall: large, varied k are not answered in
+        O(log n) each, since that would take the full O(n**2) table
+        """
+        if self.n == 0:
+            return [0] * len(ks)
+        distinct = set(ks)
+        numpy = resolve(backend) != PYTHON
+        if distinct:
+            budget = len(distinct) * (self.n.bit_length() if numpy else 1)
+            self._extend_min_spread(max(distinct), budget, backend)
+        spreads = self._min_spread
+        answers, beyond = {}, []
+        for k in distinct:
+            fits = bisect_right(spreads, k)  # Largest window size within the table
+            if fits < len(spreads) or fits == self.n:
+                answers[k] = self.n - fits
+            else:
+                beyond.append(k)
+        if beyond and numpy:
+            answers.update(self._query_block(beyond))
+        else:
+            answers.update((k, self.query(k, backend)) for k in beyond)
+        return [answers[k] for k in ks]
+
+
+    def _query_block(self, ks: list) -> dict:
+        # query for every k at once: a (len(ks), n) searchsorted, in blocks of rows
+        np = require_numpy()
+        values = self._array
+        left = np.arange(self.n)
+        answers = {}
+        step = max(1, 2**20 // self.n)
+        for start in range(0, len(ks), step):
+            block = np.asarray(ks[start:start + step])
+            right = np.searchsorted(values, values[None, :] + block[:, None], side='right')
+            longest = (right - left).max(axis=1)
+            answers.update(zip(ks[start:start + step], (self.n - longest).tolist()))
+        return answers
 
 
 def wildcard_matching(string: str, pat: str) -> bool:
     """ Wildcard matching with '?' and '*', and a base dictionary a-z (lower)
 
     This is globbing, where '?' matches any single character and '*' matches all
+
+    This naive recursion is exponential in the number of '*'. See wildcard.py for a
+    compiled matcher that is O(|s||p|) in the worst case
     """
-    # Try using recursion
-    print(string, pat)
-    s, p = len(string), len(pat)
-
-    if p == 1 and s == 1:
-        return string == pat
-    if p == 1:  # s > 1
-        return pat == '*' and wildcard_matching(string[:-1], pat)
-    if s == 1:  # p > 1
-        return False
-
-    if string[-1] == pat[-1] or pat[-1] == '?':
+    # Try using recursion, consuming both strings from the end
+    if pat == '':
+        return string == ''
+
+    if pat[-1] == '*':
+        # Either '*' matches nothing, or it absorbs the last character and stays
+        return wildcard_matching(string, pat[:-1]) or (
+            string != '' and wildcard_matching(string[:-1], pat))
+    if string != '' and (string[-1] == pat[-1] or pat[-1] == '?'):
         return wildcard_matching(string[:-1], pat[:-1])
-    if pat[0] == '*':
-        return wildcard_matching(string[:-1], pat) or wildcard_matching(string, pat[:-1])
     return False
@@ -13,6 +13,25 @@ Not all are proper metrics (recall they must satisfy the following properties:
 However, all do satisfy the property that common prefixes have no effect on distance:
     - Let a = uv, b = uw. Then d(a, b) = d(v, w)
 """
+from bisect import bisect_left
+
+from algorithms.backend import PYTHON, require_numpy, resolve
+
+
+class _Matrix:
+    """ Minimal stand-in for a 2D numpy array of ints, for the 'python' backend
+
+    Supports just the [i, j] indexing the DP implementations below rely on """
+    def __init__(self, m: int, n: int):
+        self.rows = [[0] * n for _ in range(m)]
+
+    def __getitem__(self, idx: tuple) -> int:
+        i, j = idx
+        return self.rows[i][j]
+
+    def __setitem__(self, idx: tuple, value: int):
+        i, j = idx
+        self.rows[i][j] = value
 
 
 def hamming(s1: str, s2: str) -> int:
@@ -27,6 +46,20 @@ def hamming(s1: str, s2: str) -> int:
     return distance
 
 
+def hamming_within(s1: str, s2: str, max_distance: int):
+    """ Hamming distance if it is <= max_distance, else None
+
+    Stops scanning as soon as the bound is exceeded """
+    assert len(s1) == len(s2)
+    distance = 0
+    for c1, c2 in zip(s1, s2):
+        if c1 != c2:
+            distance += 1
+            if distance > max_distance:
+                return None
+    return distance
+
+
 def levenshtein_naive(s1: str, s2: str) -> int:
     """ Naive recursive implementation, following definition of Levenshtein distance
 
@@ -49,7 +82,7 @@ def levenshtein_naive(s1: str, s2: str) -> int:
                    levenshtein_naive(s1[1:], s2[1:]))
 
 
-def levenshtein_wagner_fischer(s1: str, s2: str) -> int:
+def levenshtein_wagner_fischer(s1: str, s2: str, backend: str = None) -> int:
     """ Dynamic programming approach
 
     Observation: if we create matrix holding edit distances between all prefixes
@@ -57,16 +90,22 @@ def levenshtein_wagner_fischer(s1: str, s2: str) -> int:
     entry is the edit distance between the full strings. The invariant here is that
     the prefix s1[:i] can be transformed to s2[:j] using D[i, j] operations
 
-    Uses numpy to store matrix. It has O(|s1||s2|) complexity """
-    import numpy as np
-
+    Uses numpy to store matrix (or nested lists with the 'python' backend).
+    It has O(|s1||s2|) complexity """
     m, n = len(s1), len(s2)
 
     # Note: distance matrix is 0-indexed while strings are 1-indexed within matrix
-    distances = np.zeros((m + 1, n + 1), dtype=np.int8)
+    if resolve(backend) == PYTHON:
+        distances = _Matrix(m + 1, n + 1)
+    else:
+        np = require_numpy()
+        # Distances reach max(m, n), so int8 would silently wrap past 127
+        distances = np.zeros((m + 1, n + 1), dtype=np.int64)
     # prefixes can be transformed into empty string by dropping all characters
-    distances[:, 0] = np.arange(m + 1)
-    distances[0, :] = np.arange(n + 1)
+    for i in range(m + 1):
+        distances[i, 0] = i
+    for j in range(n + 1):
+        distances[0, j] = j
 
     for i in range(1, m + 1):
         for j in range(1, n + 1):
@@ -86,7 +125,143 @@ def levenshtein_wagner_fischer(s1: str, s2: str) -> int:
     return distances[-1, -1]
 
 
-def lcs(s1: str, s2: str) -> int:
+def levenshtein_two_row(s1: str, s2: str) -> int:
+    """ Wagner-Fischer keeping only two rows of the matrix
+
+    Each row only depends on the one above it, so O(min(|s1|, |s2|)) memory
+    suffices (rows run along the shorter string) """
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    previous = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1, start=1):
+        current = [i]
+        for j, c2 in enumerate(s2, start=1):
+            current.append(min(previous[j] + 1,  # deletion
+                               current[j-1] + 1,  # insertion
+                               previous[j-1] + (c1 != c2)))  # substitution
+        previous = current
+    return previous[-1]
+
+
+def levenshtein_myers(s1: str, s2: str) -> int:
+    """ Bit-parallel Levenshtein distance (Myers 1999, as formulated by Hyyro)
+
+    Adjacent cells of a Wagner-Fischer column differ by -1, 0 or +1, so a whole
+    column can be encoded as two bit vectors: VP (bits where the delta is +1) and
+    VN (bits where it is -1). Advancing one column is then a fixed number of word
+    operations, with the carry of an addition propagating matches down the column.
+
+    Bit vectors are Python ints, which operate on 30-bit digits internally, so this
+    runs in O(ceil(m / w) * n) time. The longer string is used as the bit vector so
+    that the (slow) Python loop runs over the shorter one
+    """
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    return _myers_distance(_match_masks(s1), len(s1), s2)
+
+
+def _match_masks(s) -> dict:
+    # peq[c] has bit i set wherever s[i] == c. Shared by the bit-parallel distances,
+    # and many-to-many callers build it once per string to reuse across comparisons
+    peq = {}
+    for i, c in enumerate(s):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    return peq
+
+
+def _myers_distance(peq: dict, m: int, text) -> int:
+    # levenshtein_myers between a length-m pattern (preprocessed into peq) and text
+    if m == 0:
+        return len(text)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    vp, vn = mask, 0  # First column is 0, 1, ..., m: every delta is +1
+    distance = m
+    for c in text:
+        eq = peq.get(c, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = vn | ~(xh | vp)
+        hn = vp & xh
+        # Horizontal delta in the last row tracks the distance itself
+        if hp & last:
+            distance += 1
+        elif hn & last:
+            distance -= 1
+        # Shift in the top row's horizontal delta, which is +1 for global distance
+        hp = (hp << 1) | 1
+        hn = hn << 1
+        vp = (hn | ~(xv | hp)) & mask
+        vn = hp & xv & mask
+    return distance
+
+
+def _strip_common_affixes(s1: str, s2: str) -> tuple:
+    # Common prefixes (and, symmetrically, suffixes) have no effect on distance
+    n = min(len(s1), len(s2))
+    start = 0
+    while start < n and s1[start] == s2[start]:
+        start += 1
+    end = 0
+    while end < n - start and s1[-1 - end] == s2[-1 - end]:
+        end += 1
+    return s1[start:len(s1) - end], s2[start:len(s2) - end]
+
+
+def levenshtein_within(s1: str, s2: str, max_distance: int):
+    """ Levenshtein distance if it is <= max_distance (k), else None
+
+    Much cheaper than the full distance when k is small:
+        - |len(s1) - len(s2)| is a lower bound, so return early if it exceeds k
+        - common prefix and suffix are stripped
+        - a path through cell (i, j) costs at least |i - j|, so only the diagonal
+          band of width 2k+1 is computed: O(k * min(|s1|, |s2|)) instead of O(|s1||s2|)
+        - values along a path never decrease, so once every cell of a row's band
+          exceeds k, no later row can get back under it
+    """
+    k = max_distance
+    if abs(len(s1) - len(s2)) > k:
+        return None
+    s1, s2 = _strip_common_affixes(s1, s2)
+    if len(s1) > len(s2):  # Rows run along the longer string, so the band fits s2
+        s1, s2 = s2, s1
+    m, n = len(s1), len(s2)
+    if m == 0:
+        return n  # Already known to be <= k
+
+    over = k + 1  # Anything above k is equivalent, so clamp to keep numbers small
+    # Rows only store their band: D[i, j] lives at index b = j - i + k. So D[i-1, j-1]
+    # is at the same index in the previous row, D[i-1, j] one to the right, and
+    # D[i, j-1] one to the left in the current row. The extra slot stays at over
+    width = 2 * k + 1
+    previous = [over] * (width + 1)
+    for b in range(k, min(width, n + k + 1)):
+        previous[b] = b - k  # Row 0: D[0, j] = j
+    for i in range(1, m + 1):
+        current = [over] * (width + 1)
+        c1 = s1[i-1]
+        row_min = over
+        for b in range(max(0, k - i), min(width, n - i + k + 1)):
+            j = i - k + b
+            if j == 0:
+                value = i
+            else:
+                value = min(previous[b+1] + 1,  # deletion
+                            (current[b-1] if b else over) + 1,  # insertion
+                            previous[b] + (c1 != s2[j-1]))  # substitution
+                if value > over:
+                    value = over
+            current[b] = value
+            if value < row_min:
+                row_min = value
+        if row_min > k:
+            return None
+        previous = current
+    distance = previous[n - m + k]
+    return distance if distance <= k else None
+
+
+def lcs(s1: str, s2: str, backend: str = None) -> int:
     """ Longest common subsequence, which does *not* have to be contiguous """
     # # This naive recursive implementation has O(2**(|s1| + |s2|)) complexity,
     # # since you must traverse down both strings. In an even worse implementation,
@@ -100,11 +275,14 @@ def lcs(s1: str, s2: str) -> int:
     #            lcs(s1[1:], s2))
 
     # The DP implementation memoizes the lcs for prefixes:
-    import numpy as np
-
     m, n = len(s1), len(s2)
     # Let the first row and column denote comparison to the empty string (so = 0)
-    distances = np.zeros((m + 1, n + 1), dtype=np.int8)
+    if resolve(backend) == PYTHON:
+        distances = _Matrix(m + 1, n + 1)
+    else:
+        np = require_numpy()
+        # int64: int8 wrapped around past 127
+        distances = np.zeros((m + 1, n + 1), dtype=np.int64)
 
     for i in range(1, m + 1):
         for j in range(1, n + 1):
@@ -115,11 +293,301 @@ def lcs(s1: str, s2: str) -> int:
     return distances[-1, -1]
 
 
-def jaro_winkler(s1: str, s2: str) -> int:
-    """ Allow only transposition """
-    pass
+def lcs_bit_parallel(s1, s2) -> int:
+    """ Bit-parallel LCS length (Allison-Dix, as simplified by Hyyro)
+
+    Along a column of the LCS matrix, values step up by 0 or 1, so a column is a
+    bit vector V with a 0 wherever it steps up. With M the match mask of the next
+    character, the next column is (V + (V & M)) | (V & ~M): the addition carries
+    each match down to the next step. The LCS is the number of zeros in V.
+
+    Works on any sequences of hashables. As in levenshtein_myers, the longer one is
+    used as the bit vector, for O(ceil(m / w) * n) time and O(m / w) space
+    """
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    return _lcs_length(_match_masks(s1), len(s1), s2)
+
+
+def _lcs_length(peq: dict, m: int, text) -> int:
+    # lcs_bit_parallel between a length-m pattern (preprocessed into peq) and text
+    mask = (1 << m) - 1
+    v = mask
+    for c in text:
+        u = v & peq.get(c, 0)
+        v = ((v + u) | (v - u)) & mask
+    return m - v.bit_count()
+
+
+def _lcs_prefix_lengths(s1, s2) -> list:
+    # LCS of s1 against every prefix of s2: row[j] = lcs(s1, s2[:j])
+    peq, m = _match_masks(s1), len(s1)
+    mask = (1 << m) - 1
+    v = mask
+    row = [0]
+    for c in s2:
+        u = v & peq.get(c, 0)
+        v = ((v + u) | (v - u)) & mask
+        row.append(m - v.bit_count())
+    return row
+
+
+def lcs_hirschberg(s1, s2) -> tuple:
+    """ Longest common subsequence itself, in linear space (Hirschberg 1975)
+
+    Split s1 in half. The LCS crosses from the top half to the bottom one at the
+    column j maximizing lcs(top, s2[:j]) + lcs(bottom, s2[j:]), which only needs
+    the last row of each half's matrix (one forward, one over the reversed strings).
+    Recursing on both sides recovers the whole alignment while only ever storing
+    rows. Each row comes from the bit-parallel recurrence, for O(m * n / w) time.
+
+    :return: (subsequence, pairs) where pairs lists the aligned (i, j) with
+        s1[i] == s2[j], increasing in both. The subsequence is a str if s1 is,
+        else a list
+    """
+    # Common prefix and suffix are always part of some LCS
+    n_prefix = 0
+    n = min(len(s1), len(s2))
+    while n_prefix < n and s1[n_prefix] == s2[n_prefix]:
+        n_prefix += 1
+    n_suffix = 0
+    while n_suffix < n - n_prefix and s1[-1 - n_suffix] == s2[-1 - n_suffix]:
+        n_suffix += 1
+
+    pairs = [(i, i) for i in range(n_prefix)]
+    # Sub-problems (i0, i1, j0, j1) are processed left to right, so pairs come out sorted
+    stack = [(n_prefix, len(s1) - n_suffix, n_prefix, len(s2) - n_suffix)]
+    while stack:
+        i0, i1, j0, j1 = stack.pop()
+        if i0 == i1 or j0 == j1:
+            continue
+        if i1 - i0 == 1:
+            for j in range(j0, j1):
+                if s2[j] == s1[i0]:
+                    pairs.append((i0, j))
+                    break
+            continue
+        mid = (i0 + i1) // 2
+        forward = _lcs_prefix_lengths(s1[i0:mid], s2[j0:j1])
+        backward = _lcs_prefix_lengths(s1[mid:i1][::-1], s2[j0:j1][::-1])
+        width = j1 - j0
+        split = max(range(width + 1), key=lambda j: forward[j] + backward[width - j])
+        stack.append((mid, i1, j0 + split, j1))
+        stack.append((i0, mid, j0, j0 + split))
+    pairs.extend((len(s1) - n_suffix + k, len(s2) - n_suffix + k) for k in range(n_suffix))
+
+    subsequence = [s1[i] for i, _ in pairs]
+    if isinstance(s1, str):
+        subsequence = ''.join(subsequence)
+    return subsequence, pairs
+
+
+def lcs_hunt_szymanski(s1, s2) -> int:
+    """ LCS length in O((r + n) log n), with r the number of matching (i, j) pairs
+
+    thresholds[k] is the smallest j at which a common subsequence of length k+1
+    can end, so far. Scanning s1, each match (i, j) can extend the subsequence
+    ending just before j, and thresholds stays sorted so that is a bisection.
+    Matches of one i are visited by decreasing j, so none of them extends another.
+
+    Fast when matches are sparse, e.g. on token sequences (lines, words) drawn from
+    a large vocabulary. There, lcs_bit_parallel's masks also cost O(m**2 / w) memory
+    (one m-bit int per distinct token), while this only stores the match lists.
+    Works on any sequences of hashables
+    """
+    positions = {}
+    for j in range(len(s2) - 1, -1, -1):
+        positions.setdefault(s2[j], []).append(j)
+
+    thresholds = []
+    for c in s1:
+        for j in positions.get(c, ()):
+            k = bisect_left(thresholds, j)
+            if k == len(thresholds):
+                thresholds.append(j)
+            else:
+                thresholds[k] = j
+    return len(thresholds)
+
+
+def jaro(s1: str, s2: str) -> float:
+    """ Jaro similarity, in [0, 1]
+
+    Characters match if they are equal and at most max(|s1|, |s2|) // 2 - 1 apart,
+    each character being matched at most once. With m matches, of which t are out
+    of order (counted in halves), similarity = (m/|s1| + m/|s2| + (m - t)/m) / 3
+    """
+    return _jaro(_match_masks(s1), len(s1), s1, s2)
+
+
+def _jaro(peq: dict, m: int, s1: str, s2: str) -> float:
+    # Jaro with s1 preprocessed into match masks. Rather than scanning s1's window
+    # for each character of s2, the window's unmatched equal characters are one
+    # mask operation away, and the first of them is the lowest set bit
+    n = len(s2)
+    if m == 0 or n == 0:
+        return float(m == n)
+    reach = max(0, max(m, n) // 2 - 1)
+    used = 0  # Bits of s1 already matched
+    matched2 = []  # Characters of s2 that matched, in order
+    for j, c in enumerate(s2):
+        lo = max(0, j - reach)
+        if lo >= m:  # Windows only move right, so nothing further can match
+            break
+        window = ((1 << (min(m, j + reach + 1) - lo)) - 1) << lo
+        available = peq.get(c, 0) & window & ~used
+        if available:
+            used |= available & -available
+            matched2.append(c)
+    n_matches = len(matched2)
+    if n_matches == 0:
+        return 0.0
+
+    # Walk the matched characters of s1 in order, against those of s2
+    half_transpositions = 0
+    for c in matched2:
+        low = used & -used
+        used ^= low
+        if s1[low.bit_length() - 1] != c:
+            half_transpositions += 1
+    return (n_matches / m + n_matches / n
+            + (n_matches - half_transpositions // 2) / n_matches) / 3
+
+
+def jaro_winkler(s1: str, s2: str, prefix_scale: float = 0.1, boost_threshold: float = 0.7) -> float:
+    """ Jaro similarity, boosted for strings sharing a prefix of up to 4 characters
+
+    Only similarities above boost_threshold are boosted, by
+    prefix_length * prefix_scale * (1 - similarity)
+    """
+    return _winkler(jaro(s1, s2), s1, s2, prefix_scale, boost_threshold)
+
+
+def _winkler(similarity: float, s1: str, s2: str, prefix_scale: float, boost_threshold: float) -> float:
+    if similarity <= boost_threshold:
+        return similarity
+    prefix = 0
+    for c1, c2 in zip(s1[:4], s2[:4]):
+        if c1 != c2:
+            break
+        prefix += 1
+    return similarity + prefix * prefix_scale * (1 - similarity)
+
+
+def damerau_levenshtein_osa(s1: str, s2: str) -> int:
+    """ Optimal string alignment distance: Levenshtein plus transposition of adjacent
+    characters, where no substring is edited more than once
+
+    Not a proper metric (it fails the triangle inequality: osa('ca', 'abc') = 3 but
+    osa('ca', 'ac') + osa('ac', 'abc') = 2). A transposition only looks two rows
+    back, so three rolling rows replace the full matrix: O(|s2|) space.
+    score_many uses a bit-parallel version instead (see _osa_distance)
+    """
+    n = len(s2)
+    before = None
+    previous = list(range(n + 1))
+    for i in range(1, len(s1) + 1):
+        c1 = s1[i-1]
+        current = [i] + [0] * n
+        for j in range(1, n + 1):
+            c2 = s2[j-1]
+            value = min(previous[j] + 1,  # deletion
+                        current[j-1] + 1,  # insertion
+                        previous[j-1] + (c1 != c2))  # substitution
+            if i > 1 and j > 1 and c1 == s2[j-2] and s1[i-2] == c2 and c1 != c2:
+                value = min(value, before[j-2] + 1)  # transposition
+            current[j] = value
+        before, previous = previous, current
+    return previous[n]
+
+
+def _osa_distance(peq: dict, m: int, text) -> int:
+    # Myers' bit-parallel recurrence (see _myers_distance) extended with adjacent
+    # transpositions (Hyyro 2003): a cell can also be reached diagonally from two
+    # rows and columns back when the current and previous characters match crosswise,
+    # which is the tr term. d0 marks cells whose diagonal delta is 0
+    if m == 0:
+        return len(text)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    vp, vn, d0, previous_eq = mask, 0, 0, 0
+    distance = m
+    for c in text:
+        eq = peq.get(c, 0)
+        tr = ((~d0 & eq) << 1) & previous_eq
+        d0 = (((eq & vp) + vp) ^ vp) | eq | vn | tr
+        hp = vn | ~(d0 | vp)
+        hn = d0 & vp
+        if hp & last:
+            distance += 1
+        elif hn & last:
+            distance -= 1
+        hp = (hp << 1) | 1
+        hn = hn << 1
+        vp = (hn | ~(d0 | hp)) & mask
+        vn = hp & d0 & mask
+        previous_eq = eq
+    return distance
 
 
 def damerau_levenshtein(s1: str, s2: str) -> int:
-    """ Allow insert, delete, substitute, transposition """
-    pass
+    """ Allow insert, delete, substitute, transposition (Lowrance-Wagner)
+
+    Unlike damerau_levenshtein_osa, characters may still be edited after being
+    transposed, which makes this a proper metric. A transposition of s1[k] and
+    s2[l] can now be arbitrarily far back, so the full matrix is kept, along with
+    an alphabet map from each character to the last row of s1 it appeared on
+    """
+    m, n = len(s1), len(s2)
+    over = m + n  # Larger than any distance: marks the border cells
+    # Shifted by one row and column, for that border
+    d = [[over] * (n + 2) for _ in range(m + 2)]
+    for i in range(m + 1):
+        d[i+1][1] = i
+    for j in range(n + 1):
+        d[1][j+1] = j
+
+    last_row = {}  # Last row (1-based) of s1 on which each character appeared
+    for i in range(1, m + 1):
+        c1 = s1[i-1]
+        last_col = 0  # Last column (1-based) of s2 matching c1 on this row
+        above, row = d[i], d[i+1]
+        for j in range(1, n + 1):
+            c2 = s2[j-1]
+            k = last_row.get(c2, 0)
+            l = last_col
+            if c1 == c2:
+                cost = 0
+                last_col = j
+            else:
+                cost = 1
+            row[j+1] = min(above[j] + cost,  # substitution
+                           row[j] + 1,  # insertion
+                           above[j+1] + 1,  # deletion
+                           # transposition, editing whatever lies in between
+                           d[k][l] + (i - k - 1) + 1 + (j - l - 1))
+        last_row[c1] = i
+    return d[m+1][n+1]
+
+
+# score_many metrics: name -> (prepare(query), score(prepared, query, candidate))
+_SCORERS = {
+    'levenshtein': (_match_masks, lambda peq, q, c: _myers_distance(peq, len(q), c)),
+    'damerau_levenshtein': (None, lambda _, q, c: damerau_levenshtein(q, c)),
+    'damerau_levenshtein_osa': (_match_masks, lambda peq, q, c: _osa_distance(peq, len(q), c)),
+    'jaro': (_match_masks, lambda peq, q, c: _jaro(peq, len(q), q, c)),
+    'jaro_winkler': (_match_masks, lambda peq, q, c: _winkler(_jaro(peq, len(q), q, c), q, c, 0.1, 0.7)),
+}
+
+
+def score_many(query: str, candidates, metric: str = 'jaro_winkler') -> list:
+    """ metric(query, candidate) for every candidate
+
+    Everything that only depends on the query (e.g. its match masks) is prepared
+    once up front, rather than once per call
+    """
+    if metric not in _SCORERS:
+        raise ValueError(f'metric {metric!r} is not recognized. Expected one of {tuple(_SCORERS)}')
+    prepare, score = _SCORERS[metric]
+    prepared = prepare(query) if prepare is not None else None
+    return [score(prepared, query, candidate) for candidate in candidates]
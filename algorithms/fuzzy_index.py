@@ -0,0 +1,239 @@
+"""
+Indexes for fuzzy (typo-tolerant) dictionary lookup under Levenshtein distance
+
+Comparing a query against every entry costs O(N) full distance computations. Two
+ways to avoid most of them:
+
+- BKTree: a metric tree. Each child edge is labelled with its distance to the
+  parent, and by the triangle inequality only edges within max_distance of the
+  query's distance to the parent can lead to matches
+- TrieIndex: walks a trie of the dictionary, carrying one Wagner-Fischer row per
+  node. Words sharing a prefix share the rows for that prefix, and a subtree is
+  pruned as soon as every cell of its row exceeds max_distance
+
+Both record the work done by their last query in :last_stats:
+"""
+import heapq
+import json
+
+from algorithms.edit_distance import levenshtein_myers
+
+
+class BKTree:
+    """ Burkhard-Keller tree over a dictionary of words
+
+    Nodes are stored flat (word list, plus a {distance: child index} dict per node)
+    so that neither building, searching nor serializing recurses
+    """
+    def __init__(self, distance=levenshtein_myers):
+        self.distance = distance
+        self.words = []
+        self.children = []
+        self.last_stats = {}
+
+    def __len__(self):
+        return len(self.words)
+
+
+    @classmethod
+    def build(cls, words, distance=levenshtein_myers):
+        """ Bulk-build from an iterable of words (duplicates are ignored) """
+        tree = cls(distance)
+        for word in dict.fromkeys(words):
+            tree.add(word)
+        return tree
+
+
+    def add(self, word: str):
+        if not self.words:
+            self.words.append(word)
+            self.children.append({})
+            return
+
+        node = 0
+        while True:
+            d = self.distance(word, self.words[node])
+            if d == 0:  # Already present
+                return
+            child = self.children[node].get(d)
+            if child is None:
+                self.children[node][d] = len(self.words)
+                self.words.append(word)
+                self.children.append({})
+                return
+            node = child
+
+
+    def search(self, query: str, max_distance: int) -> list:
+        """ All (distance, word) within max_distance of query, closest first """
+        results = []
+        visited = 0
+        stack = [0] if self.words else []
+        while stack:
+            node = stack.pop()
+            visited += 1
+            d = self.distance(query, self.words[node])
+            if d <= max_distance:
+                results.append((d, self.words[node]))
+            for edge, child in self.children[node].items():
+                if d - max_distance <= edge <= d + max_distance:
+                    stack.append(child)
+
+        self.last_stats = {'visited': visited, 'nodes': len(self.words)}
+        results.sort()
+        return results
+
+
+    def nearest(self, query: str, k: int = 1) -> list:
+        """ The k (distance, word) closest to query, closest first
+
+        Same traversal as search, except the radius shrinks to the k-th best
+        distance found so far
+        """
+        best = []  # Max-heap (by negated distance) of the k best so far
+        visited = 0
+        stack = [0] if self.words else []
+        while stack:
+            node = stack.pop()
+            visited += 1
+            word = self.words[node]
+            d = self.distance(query, word)
+            if len(best) < k:
+                heapq.heappush(best, (-d, word))
+            elif d < -best[0][0]:
+                heapq.heapreplace(best, (-d, word))
+            radius = -best[0][0] if len(best) == k else float('inf')
+            for edge, child in self.children[node].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+
+        self.last_stats = {'visited': visited, 'nodes': len(self.words)}
+        return sorted((-neg_d, word) for neg_d, word in best)
+
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'words': self.words,
+                'children': [list(edges.items()) for edges in self.children],
+            }, f)
+
+    @classmethod
+    def load(cls, path, distance=levenshtein_myers):
+        with open(path) as f:
+            data = json.load(f)
+        tree = cls(distance)
+        tree.words = data['words']
+        tree.children = [dict(edges) for edges in data['children']]
+        return tree
+
+
+class TrieIndex:
+    """ Trie over a dictionary, searched by sharing DP rows across common prefixes
+
+    Node 0 is the root. children[i] maps a character to a child node, and
+    terminal[i] is the word ending at node i (or None)
+    """
+    def __init__(self):
+        self.children = [{}]
+        self.terminal = [None]
+        self.n_words = 0
+        self.last_stats = {}
+
+    def __len__(self):
+        return self.n_words
+
+
+    @classmethod
+    def build(cls, words):
+        """ Bulk-build from an iterable of words (duplicates are ignored) """
+        trie = cls()
+        for word in words:
+            trie.add(word)
+        return trie
+
+
+    def add(self, word: str):
+        node = 0
+        for c in word:
+            child = self.children[node].get(c)
+            if child is None:
+                child = len(self.children)
+                self.children[node][c] = child
+                self.children.append({})
+                self.terminal.append(None)
+            node = child
+        if self.terminal[node] is None:
+            self.terminal[node] = word
+            self.n_words += 1
+
+
+    def _walk(self, query: str, radius):
+        # Depth-first walk yielding (distance, word) for every word whose distance
+        # is <= radius(). radius is re-read at every node, so callers may shrink it
+        visited = 0
+        first_row = list(range(len(query) + 1))  # Distance from the empty prefix
+        stack = [(0, first_row)]
+        while stack:
+            node, row = stack.pop()
+            visited += 1
+            if self.terminal[node] is not None and row[-1] <= radius():
+                yield row[-1], self.terminal[node]
+            for c, child in self.children[node].items():
+                # Next Wagner-Fischer row, for the node's prefix extended by c
+                next_row = [row[0] + 1]
+                for j, q in enumerate(query, start=1):
+                    next_row.append(min(row[j] + 1,  # deletion
+                                        next_row[j-1] + 1,  # insertion
+                                        row[j-1] + (q != c)))  # substitution
+                # Distances only grow further down the trie, so prune on the row minimum
+                if min(next_row) <= radius():
+                    stack.append((child, next_row))
+        self.last_stats = {'visited': visited, 'nodes': len(self.children)}
+
+
+    def search(self, query: str, max_distance: int) -> list:
+        """ All (distance, word) within max_distance of query, closest first """
+        return sorted(self._walk(query, lambda: max_distance))
+
+
+    def nearest(self, query: str, k: int = 1) -> list:
+        """ The k (distance, word) closest to query, closest first """
+        best = []  # Max-heap (by negated distance) of the k best so far
+
+        def radius():
+            return -best[0][0] if len(best) == k else float('inf')
+
+        for d, word in self._walk(query, radius):
+            if len(best) < k:
+                heapq.heappush(best, (-d, word))
+            elif d < -best[0][0]:
+                heapq.heapreplace(best, (-d, word))
+        return sorted((-neg_d, word) for neg_d, word in best)
+
+
+    def save(self, path):
+        # Words are implied by the trie paths, so storing the terminal flags suffices
+        with open(path, 'w') as f:
+            json.dump({
+                'children': self.children,
+                'terminal': [word is not None for word in self.terminal],
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        trie = cls()
+        trie.children = data['children']
+        trie.terminal = [None] * len(trie.children)
+        # Rebuild the words by walking the trie
+        stack = [(0, '')]
+        while stack:
+            node, prefix = stack.pop()
+            if data['terminal'][node]:
+                trie.terminal[node] = prefix
+                trie.n_words += 1
+            for c, child in trie.children[node].items():
+                stack.append((child, prefix + c))
+        return trie
@@ -0,0 +1,106 @@
+"""
+k-sum problems: pairs and triplets of elements adding up to a given sum
+
+two_pointers.find_exact_pairwise_sum needs sorted input and stops at the first
+pair. Here every match is yielded from a generator, so results can be streamed
+(or the search abandoned early) without building a list:
+    - pair_indices_with_sum: every pair of positions, including repeated values,
+      from a hash index built in the same single pass. No sort, so the first
+      pairs come out after reading only as much input as needed
+    - pairs_with_sum: every distinct pair of values, by hashing unsorted input or
+      two pointers over sorted input
+    - triplets_with_sum: every distinct triplet of values in O(n^2), with the
+      inner scan over pairs vectorized by the 'numpy' backend
+"""
+from algorithms import two_pointers
+from algorithms.backend import PYTHON, require_numpy, resolve
+
+
+def pair_indices_with_sum(array, s):
+    """ Yield every (i, j), i < j, with array[i] + array[j] == s, in order of j
+
+    Single pass over any iterable: positions are indexed by value as they are read,
+    so each element meets all its earlier partners in O(1) plus their number
+    """
+    seen = {}
+    for j, x in enumerate(array):
+        for i in seen.get(s - x, ()):
+            yield i, j
+        if x in seen:
+            seen[x].append(j)
+        else:
+            seen[x] = [j]
+
+
+def pairs_with_sum(array, s, presorted: bool = False):
+    """ Yield every distinct (a, b), a <= b, of values in array with a + b == s
+
+    a == b requires the value to occur twice. Unsorted input is hashed in one pass,
+    yielding pairs as soon as their second element is read. With presorted, two
+    pointers are used instead, and pairs come out in increasing order of a
+    """
+    if presorted:
+        n = len(array)
+        i, j = 0, n - 1
+        while i < j:
+            current_sum = array[i] + array[j]
+            if current_sum < s:
+                i += 1
+            elif current_sum > s:
+                j -= 1
+            else:
+                a, b = array[i], array[j]
+                yield a, b
+                while i < j and array[i] == a:
+                    i += 1
+                while i < j and array[j] == b:
+                    j -= 1
+        return
+
+    seen = set()
+    emitted = set()  # Smaller value of each pair already yielded
+    for x in array:
+        y = s - x
+        if y in seen:
+            a, b = (x, y) if x <= y else (y, x)
+            if a not in emitted:
+                emitted.add(a)
+                yield a, b
+        seen.add(x)
+
+
+def triplets_with_sum(array, s=0, backend: str = None):
+    """ Yield every distinct (a, b, c), a <= b <= c, of values in array summing to s
+
+    Triplets come out in increasing order. The 'python' backend runs
+    two_pointers.triplets_with_sum over the sorted array. The 'numpy' backend works
+    on the distinct values and their counts instead: for each a, every candidate b
+    is checked at once, with c = s - a - b looked up by np.searchsorted, and the
+    counts ruling out values used more often than they occur
+    """
+    if resolve(backend) == PYTHON:
+        yield from two_pointers.triplets_with_sum(sorted(array), s)
+        return
+
+    np = require_numpy()
+    values, counts = np.unique(np.asarray(array), return_counts=True)
+    for p in range(len(values)):
+        a = values[p]
+        b_index = np.arange(p, len(values))
+        c = s - a - values[b_index]
+        # Each pair is considered once, as b <= c
+        keep = c >= values[b_index]
+        if not keep.any():
+            break  # Larger a only make c smaller, and b larger
+        b_index, c = b_index[keep], c[keep]
+        c_index = np.minimum(np.searchsorted(values, c), len(values) - 1)
+        keep = values[c_index] == c
+        b_index, c = b_index[keep], c[keep]
+        b = values[b_index]
+        # Values used more than once must occur often enough. As a <= b <= c, a
+        # value shared with a is checked against a's count, and otherwise b == c
+        # against b's
+        enough = (counts[p] >= 1 + (b == a) + (c == a)) & ((b == a) | (counts[b_index] >= 1 + (c == b)))
+        a = a.item()
+        for b_value, c_value in zip(b[enough].tolist(), c[enough].tolist()):
+            yield a, b_value, c_value
@@ -0,0 +1,183 @@
+"""
+Hamming distance between fixed-length fingerprints (hashes, bit vectors), in bulk
+
+edit_distance.hamming compares two strings symbol by symbol. Fingerprints are
+instead packed into 64-bit words, so one XOR finds the differing bits of 64
+positions at once and a popcount counts them. Kernels compare one query against a
+database, every query against every entry, or keep the k nearest entries.
+
+Fingerprints can be given as:
+    - bytes, bytearray or memoryview: a single fingerprint
+    - a list or tuple: one fingerprint per element, each bytes-like or an int < 2**64
+    - a NumPy array: one fingerprint per row (or a single one if 1D). uint8 rows are
+      packed bytes, bool rows are unpacked bits, and other integer types are words
+All fingerprints compared must have the same size. With the 'python' backend,
+fingerprints are Python ints and distances come from int.bit_count
+"""
+import heapq
+
+from algorithms.backend import PYTHON, require_numpy, resolve
+
+# Number of distances computed per block: bounds the temporaries to a few MiB
+_BLOCK = 2**20
+
+_popcount_table = None
+
+
+def pack(fingerprints):
+    """ Fingerprints as an (n, words) uint64 array, zero-padded to whole words """
+    np = require_numpy()
+    if isinstance(fingerprints, (bytes, bytearray, memoryview)):
+        fingerprints = [fingerprints]
+    if isinstance(fingerprints, (list, tuple)):
+        if all(isinstance(f, int) for f in fingerprints):
+            return np.array(fingerprints, dtype=np.uint64).reshape(-1, 1)
+        rows = [bytes(f) for f in fingerprints]
+        if len({len(row) for row in rows}) > 1:
+            raise ValueError('fingerprints must all have the same size')
+        size = len(rows[0]) if rows else 0
+        fingerprints = np.frombuffer(b''.join(rows), dtype=np.uint8).reshape(len(rows), size)
+
+    array = np.asarray(fingerprints)
+    if array.ndim == 1:
+        array = array[None, :]
+    if array.dtype == np.bool_:
+        array = np.packbits(array, axis=1)
+    elif not np.issubdtype(array.dtype, np.integer):
+        raise TypeError(f'cannot pack fingerprints of dtype {array.dtype}')
+    if array.dtype == np.uint64:
+        return np.ascontiguousarray(array)
+
+    # Reinterpret the raw bytes of each row, padded up to whole words
+    array = np.ascontiguousarray(array).view(np.uint8)
+    padding = -array.shape[1] % 8
+    if padding:
+        array = np.concatenate([array, np.zeros((len(array), padding), dtype=np.uint8)], axis=1)
+    return array.view(np.uint64)
+
+
+def _popcount(np, x):
+    # Set bits of each element of a uint64 array
+    if hasattr(np, 'bitwise_count'):  # NumPy >= 2.0
+        return np.bitwise_count(x)
+    # Otherwise look up each byte's count
+    global _popcount_table
+    if _popcount_table is None:
+        _popcount_table = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    counts = _popcount_table[x.view(np.uint8)]
+    return counts.reshape(x.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def _block_distances(np, queries, columns):
+    # (len(queries), n) distances between queries and a database stored word-major,
+    # as a (words, n) array so each word's column is contiguous. Accumulated one
+    # word at a time so the only temporaries are 2D, in the smallest dtype that fits
+    words = queries.shape[1]
+    if words == 1:
+        return _popcount(np, queries[:, 0, None] ^ columns[0][None, :])
+    distances = np.zeros((len(queries), columns.shape[1]), dtype=np.uint16 if words < 1024 else np.uint32)
+    xor = np.empty(distances.shape, dtype=np.uint64)
+    for w in range(words):
+        np.bitwise_xor(queries[:, w, None], columns[w][None, :], out=xor)
+        distances += _popcount(np, xor)
+    return distances
+
+
+def _check_words(queries, database):
+    if queries.shape[1] != database.shape[1]:
+        raise ValueError('queries and database fingerprints must have the same size')
+
+
+def _as_ints(fingerprints) -> list:
+    # Fingerprints as Python ints, for the 'python' backend
+    if isinstance(fingerprints, (bytes, bytearray, memoryview)):
+        fingerprints = [fingerprints]
+    if isinstance(fingerprints, (list, tuple)):
+        return [f if isinstance(f, int) else int.from_bytes(f, 'little') for f in fingerprints]
+    return [int.from_bytes(row.tobytes(), 'little') for row in pack(fingerprints)]
+
+
+def distances(query, database, backend: str = None):
+    """ Distance from a single query fingerprint to every database fingerprint """
+    if resolve(backend) == PYTHON:
+        query, = _as_ints(query)
+        return [(query ^ f).bit_count() for f in _as_ints(database)]
+    np = require_numpy()
+    query, database = pack(query), pack(database)
+    _check_words(query, database)
+    return _block_distances(np, query, database.T)[0].astype(np.int32)
+
+
+def distance_matrix(queries, database, backend: str = None):
+    """ (len(queries), len(database)) distances between every pair """
+    if resolve(backend) == PYTHON:
+        database = _as_ints(database)
+        return [[(q ^ f).bit_count() for f in database] for q in _as_ints(queries)]
+    np = require_numpy()
+    queries, database = pack(queries), pack(database)
+    _check_words(queries, database)
+    columns = np.ascontiguousarray(database.T)
+    result = np.empty((len(queries), len(database)), dtype=np.int32)
+    step = max(1, _BLOCK // max(1, len(database)))
+    for q0 in range(0, len(queries), step):
+        result[q0:q0 + step] = _block_distances(np, queries[q0:q0 + step], columns)
+    return result
+
+
+def top_k(queries, database, k: int = 1, backend: str = None) -> tuple:
+    """ The k database fingerprints nearest to each query
+
+    Ties are broken by database index. The full distance matrix is never built:
+    the database is scanned in blocks, keeping a running top k per query.
+
+    :return: (indices, distances), each (len(queries), min(k, len(database)))
+    """
+    if resolve(backend) == PYTHON:
+        database = _as_ints(database)
+        indices, dists = [], []
+        for q in _as_ints(queries):
+            best = heapq.nsmallest(k, [((q ^ f).bit_count(), i) for i, f in enumerate(database)])
+            indices.append([i for _, i in best])
+            dists.append([d for d, _ in best])
+        return indices, dists
+
+    np = require_numpy()
+    queries, database = pack(queries), pack(database)
+    _check_words(queries, database)
+    n = len(database)
+    k = min(k, n)
+    if k == 0:
+        empty = np.empty((len(queries), 0), dtype=np.int64)
+        return empty, empty.copy()
+    columns = np.ascontiguousarray(database.T)
+
+    # Distance and index are combined into one sortable key (distance * n + index),
+    # so ties go to the lower index. Until a query has k candidates, its entries
+    # are padded with a key larger than any other
+    padding = np.iinfo(np.int64).max
+    keys = np.empty((len(queries), k), dtype=np.int64)
+    query_step = min(len(queries), 256) or 1
+    step = max(k, _BLOCK // query_step)
+    for q0 in range(0, len(queries), query_step):
+        block_queries = queries[q0:q0 + query_step]
+        n_queries = len(block_queries)
+        best = np.full((n_queries, k), padding, dtype=np.int64)
+        query_index = np.repeat(np.arange(n_queries), k)
+        for d0 in range(0, n, step):
+            distances = _block_distances(np, block_queries, columns[:, d0:d0 + step])
+            # Only entries strictly closer than a query's current k-th best can
+            # enter its top k (on a tie, the current one has the lower index). Once
+            # the top k is tight these are few, so most of the block is dropped here
+            rows, cols = np.nonzero(distances < (best[:, -1] // n)[:, None])
+            if len(rows) == 0:
+                continue
+            candidate_keys = distances[rows, cols].astype(np.int64) * n + (cols + d0)
+            all_rows = np.concatenate([query_index, rows])
+            all_keys = np.concatenate([best.ravel(), candidate_keys])
+            order = np.lexsort((all_keys, all_rows))
+            # Every query has at least its k current entries, so its new top k are
+            # the first k of its run in the sorted order
+            starts = np.searchsorted(all_rows[order], np.arange(n_queries))
+            best = all_keys[order[starts[:, None] + np.arange(k)]]
+        keys[q0:q0 + query_step] = best
+    return keys % n, keys // n
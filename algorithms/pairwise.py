@@ -0,0 +1,226 @@
+"""
+Many-to-many distance matrices
+
+pairwise(strings_a, strings_b) computes the distance between every string of a
+and every string of b. Compared to calling a distance function n**2 times:
+- every string is encoded once, as a tuple of small ints from a shared codebook,
+  and per-string preprocessing (bit masks for the bit-parallel kernels, the 2D
+  array for hamming) is done once per tile rather than once per pair
+- with a single collection the result is symmetric, so only the upper triangle
+  of tiles is computed and mirrored
+- the output is cut into tile_size x tile_size tiles which are handed out to a
+  process pool. Workers write their tiles straight into a memory-mapped output
+  file, so dense results are never pickled back to the parent
+- with a threshold, only pairs within it are kept and returned in sparse form,
+  and pairs are ruled out early by length, or by a banded kernel for tiny thresholds
+"""
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from algorithms.backend import require_numpy
+from algorithms.edit_distance import (
+    _lcs_length,
+    _match_masks,
+    _myers_distance,
+    levenshtein_within,
+)
+
+HAMMING = 'hamming'
+LEVENSHTEIN = 'levenshtein'
+LCS = 'lcs'
+METRICS = (HAMMING, LEVENSHTEIN, LCS)
+
+_DTYPE = 'int32'
+# Largest threshold for which levenshtein_within beats a full Myers distance
+_BANDED_MAX_THRESHOLD = 1
+
+# Per-process state: set once by _init_worker in pool workers, rather than being
+# shipped along with every tile
+_state = {}
+
+
+def pairwise(strings_a, strings_b=None, metric: str = LEVENSHTEIN, threshold: int = None,
+             n_jobs: int = 1, tile_size: int = 256, out=None):
+    """ All pairwise distances between strings_a and strings_b
+
+    :param strings_b: if None, compare strings_a against itself
+    :param metric: 'hamming' (all strings must have the same length), 'levenshtein'
+        or 'lcs' (a similarity: length of the longest common subsequence)
+    :param threshold: if given, only keep pairs at distance <= threshold (not
+        supported for 'lcs'). Against itself, only pairs i < j are reported
+    :param n_jobs: number of worker processes; None uses every core
+    :param tile_size: side of the square blocks of pairs handed to workers
+    :param out: path of a file to memory-map the dense result into. By default it is
+        returned as an in-memory array. Not supported with a threshold
+    :return: a (len(strings_a), len(strings_b)) int32 array, or with a threshold,
+        (rows, cols, distances) arrays sorted by row then column
+    """
+    np = require_numpy()
+    if metric not in METRICS:
+        raise ValueError(f'metric {metric!r} is not recognized. Expected one of {METRICS}')
+    if threshold is not None and metric == LCS:
+        raise ValueError('threshold is only supported for distance metrics')
+    if threshold is not None and out is not None:
+        raise ValueError('out is only supported for dense results, not with a threshold')
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+
+    symmetric = strings_b is None
+    codebook = {}
+    a = _encode(strings_a, codebook)
+    b = a if symmetric else _encode(strings_b, codebook)
+    if metric == HAMMING:
+        a, b = _hamming_arrays(np, a, b, symmetric)
+    shape = (len(a), len(b))
+    state = {'a': a, 'b': b, 'metric': metric, 'threshold': threshold, 'symmetric': symmetric}
+    tiles = list(_tiles(shape, tile_size, symmetric))
+
+    if threshold is not None:
+        if n_jobs == 1:
+            parts = [_compute_tile(state, tile) for tile in tiles]
+        else:
+            with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=(state, None)) as pool:
+                parts = list(pool.map(_pool_tile, tiles))
+        return _sparse(np, parts)
+
+    if n_jobs == 1:
+        # No workers to share with, so only map a file if the caller asked for one
+        if out is None:
+            state['out'] = np.zeros(shape, dtype=_DTYPE)
+        else:
+            state['out'] = np.lib.format.open_memmap(out, mode='w+', dtype=_DTYPE, shape=shape)
+        for tile in tiles:
+            _compute_tile(state, tile)
+        return state['out']
+
+    path = out
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.npy')
+        os.close(fd)
+    result = np.lib.format.open_memmap(path, mode='w+', dtype=_DTYPE, shape=shape)
+    try:
+        with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=(state, path)) as pool:
+            for _ in pool.map(_pool_tile, tiles):
+                pass
+        result.flush()
+        return result if out is not None else np.array(result)
+    finally:
+        if out is None:
+            del result
+            os.remove(path)
+
+
+def _encode(strings, codebook: dict) -> list:
+    # Map every symbol to a small int, shared across both collections
+    return [tuple(codebook.setdefault(c, len(codebook)) for c in s) for s in strings]
+
+
+def _hamming_arrays(np, a, b, symmetric: bool):
+    # Hamming compares position by position, so a whole collection fits a 2D array
+    lengths = {len(s) for s in a} | {len(s) for s in b}
+    if len(lengths) > 1:
+        raise ValueError('hamming requires all strings to have the same length')
+    length = lengths.pop() if lengths else 0
+    a = np.array(a, dtype=np.int32).reshape(len(a), length)
+    return a, a if symmetric else np.array(b, dtype=np.int32).reshape(len(b), length)
+
+
+def _tiles(shape: tuple, tile_size: int, symmetric: bool):
+    n_a, n_b = shape
+    for i0 in range(0, n_a, tile_size):
+        # Against itself, tiles below the diagonal are mirrors of those above it
+        for j0 in range(i0 if symmetric else 0, n_b, tile_size):
+            yield i0, min(i0 + tile_size, n_a), j0, min(j0 + tile_size, n_b)
+
+
+def _init_worker(state: dict, out_path):
+    _state.update(state)
+    if out_path is not None:
+        np = require_numpy()
+        _state['out'] = np.load(out_path, mmap_mode='r+')
+
+
+def _pool_tile(tile: tuple):
+    return _compute_tile(_state, tile)
+
+
+def _compute_tile(state: dict, tile: tuple):
+    """ Distances for one tile. Dense results are written into state['out'] and
+    None is returned; with a threshold, (rows, cols, distances) lists are returned """
+    np = require_numpy()
+    i0, i1, j0, j1 = tile
+    a, b, metric, threshold = state['a'], state['b'], state['metric'], state['threshold']
+    diagonal = state['symmetric'] and i0 == j0
+
+    if metric == HAMMING:
+        block = (a[i0:i1, None, :] != b[None, j0:j1, :]).sum(axis=2, dtype=_DTYPE)
+        if threshold is None:
+            return _write(np, state, block, tile, diagonal)
+        keep = block <= threshold
+        if diagonal:
+            keep = np.triu(keep, 1)
+        rows, cols = np.nonzero(keep)
+        return (rows + i0).tolist(), (cols + j0).tolist(), block[rows, cols].tolist()
+
+    if threshold is not None:
+        # The banded levenshtein_within does O(threshold) work per character in
+        # Python, so past a tiny threshold Myers' O(1) word operations win, once
+        # the length difference has ruled out what it can
+        banded = threshold <= _BANDED_MAX_THRESHOLD
+        rows, cols, distances = [], [], []
+        for i in range(i0, i1):
+            s1 = a[i]
+            peq, m = (None, None) if banded else (_match_masks(s1), len(s1))
+            for j in range(i + 1 if diagonal else j0, j1):
+                s2 = b[j]
+                if banded:
+                    distance = levenshtein_within(s1, s2, threshold)
+                elif abs(m - len(s2)) <= threshold:
+                    distance = _myers_distance(peq, m, s2)
+                    if distance > threshold:
+                        distance = None
+                else:
+                    distance = None
+                if distance is not None:
+                    rows.append(i)
+                    cols.append(j)
+                    distances.append(distance)
+        return rows, cols, distances
+
+    block = np.zeros((i1 - i0, j1 - j0), dtype=_DTYPE)
+    # Both kernels are bit-parallel over s1, whose masks are built once per row
+    kernel = _myers_distance if metric == LEVENSHTEIN else _lcs_length
+    # Diagonal distances are 0 so they are skipped, but lcs(s, s) = len(s)
+    skip = 1 if metric == LEVENSHTEIN else 0
+    for i in range(i0, i1):
+        s1 = a[i]
+        peq, m = _match_masks(s1), len(s1)
+        for j in range(i + skip if diagonal else j0, j1):
+            block[i - i0, j - j0] = kernel(peq, m, b[j])
+    return _write(np, state, block, tile, diagonal)
+
+
+def _write(np, state: dict, block, tile: tuple, diagonal: bool):
+    i0, i1, j0, j1 = tile
+    out = state['out']
+    if diagonal:
+        # Only the upper triangle (and diagonal) of the block was computed
+        out[i0:i1, j0:j1] = np.triu(block) + np.triu(block, 1).T
+    else:
+        out[i0:i1, j0:j1] = block
+        if state['symmetric']:
+            out[j0:j1, i0:i1] = block.T
+
+
+def _sparse(np, parts: list) -> tuple:
+    rows, cols, distances = [], [], []
+    for part_rows, part_cols, part_distances in parts:
+        rows += part_rows
+        cols += part_cols
+        distances += part_distances
+    rows = np.array(rows, dtype=np.int64)
+    cols = np.array(cols, dtype=np.int64)
+    distances = np.array(distances, dtype=_DTYPE)
+    order = np.lexsort((cols, rows))
+    return rows[order], cols[order], distances[order]
@@ -1,29 +1,84 @@
 """
 Some problems that can be solved using recursion
 """
-try:
-    import numpy as np
-    _numpy_available = True
-except ImportError:
-    print('numpy not detected in environment. Some solutions will fail to run!')
-    _numpy_available = False
+from algorithms.backend import PYTHON, require_numpy, resolve
 
 
 def tower_of_hanoi(n: int, source: int = 'source', dest: int = 'dest', aux: int = 'aux'):
     """ See https://en.wikipedia.org/wiki/Tower_of_Hanoi
 
     This solution has O(2^n) complexity """
+    moves = []
+    _tower_of_hanoi(n, source, dest, aux, moves)
+    return moves
+
+
+def _tower_of_hanoi(n, source, dest, aux, moves):
+    # Appending to a single shared list, rather than returning and splatting
+    # sub-lists, keeps the total copying at O(2^n) instead of O(n * 2^n)
     if n == 1:
-        return [(1, source, dest)]
+        moves.append((1, source, dest))
+        return
     # The starting state has the entire current stack at source, aux is empty,
     # and everything in dest is, by construction, larger than anything left.
 
     # Move stack so that bottommost ring can be placed in terminal destination
-    stack_to_aux = tower_of_hanoi(n-1, source, aux, dest)
-    intermediate_step = (n, source, dest)
+    _tower_of_hanoi(n-1, source, aux, dest, moves)
+    moves.append((n, source, dest))
     # Swap labels of source and aux, and recurse
-    stack_to_dest = tower_of_hanoi(n-1, aux, dest, source)
-    return [*stack_to_aux, intermediate_step, *stack_to_dest]
+    _tower_of_hanoi(n-1, aux, dest, source, moves)
+
+
+def move_at(i: int, n: int, source: int = 'source', dest: int = 'dest', aux: int = 'aux'):
+    """ The i-th (0-based) move of tower_of_hanoi(n), computed directly in O(1)
+
+    Numbering moves from m = i + 1, ring r moves on every m that is an odd multiple
+    of 2^(r-1), so the ring is one more than the number of trailing zeros of m. Moves
+    go from peg (m & m-1) % 3 to peg ((m | m-1) + 1) % 3, where pegs are numbered so
+    that the tower ends up on peg 2 when n is odd and peg 1 when n is even
+    """
+    if not 0 <= i < 2**n - 1:
+        raise IndexError(f'Tower of Hanoi with {n} rings has no move {i}')
+    m = i + 1
+    pegs = (source, aux, dest) if n % 2 else (source, dest, aux)
+    return (m & -m).bit_length(), pegs[(m & (m - 1)) % 3], pegs[((m | (m - 1)) + 1) % 3]
+
+
+def iter_tower_of_hanoi(n: int, source: int = 'source', dest: int = 'dest', aux: int = 'aux',
+                        start: int = 0):
+    """ Lazily yield the moves of tower_of_hanoi(n), beginning at move :start:
+
+    Each move is computed from its index as in move_at, so this takes O(1) time
+    per move and O(1) memory, and can resume anywhere in the sequence
+    """
+    pegs = (source, aux, dest) if n % 2 else (source, dest, aux)
+    for m in range(start + 1, 2**n):
+        yield (m & -m).bit_length(), pegs[(m & (m - 1)) % 3], pegs[((m | (m - 1)) + 1) % 3]
+
+
+def iter_tower_of_hanoi_chunks(n: int, chunk_size: int = 2**20, start: int = 0):
+    """ Yield the moves of tower_of_hanoi(n) as NumPy arrays of up to :chunk_size: rows
+
+    Each row is (ring, from, to), with pegs encoded as 0 = source, 1 = aux and
+    2 = dest, all as uint8. The formulas of move_at are applied to a whole range of
+    move numbers at once. Requires n <= 63, so move numbers fit in uint64
+    """
+    if n > 63:
+        raise ValueError('Chunked moves are only supported for n <= 63')
+    np = require_numpy()
+    # Map the formulas' peg numbering onto (source, aux, dest) = (0, 1, 2)
+    pegs = np.array([0, 1, 2] if n % 2 else [0, 2, 1], dtype=np.uint8)
+    total = 2**n - 1
+    one = np.uint64(1)
+    for chunk_start in range(start, total, chunk_size):
+        m = np.arange(chunk_start + 1, min(chunk_start + chunk_size, total) + 1, dtype=np.uint64)
+        lowest_bit = m & ~(m - one)
+        moves = np.empty((len(m), 3), dtype=np.uint8)
+        # frexp returns e with lowest_bit = 0.5 * 2^e exactly, so e = trailing zeros + 1
+        moves[:, 0] = np.frexp(lowest_bit.astype(np.float64))[1]
+        moves[:, 1] = pegs[(m & (m - one)) % np.uint64(3)]
+        moves[:, 2] = pegs[((m | (m - one)) + one) % np.uint64(3)]
+        yield moves
 
 
 class TowerOfHanoi:
@@ -61,6 +116,11 @@ class TowerOfHanoi:
         self.state[to_].append(self.state[from_].pop())
 
     def evaluate(self, verbose=True):
+        if self.n >= 20:
+            # Replaying millions of moves on lists, let alone printing each state,
+            # is far too slow. Stream moves through the bit-packed simulator instead
+            return self._evaluate_simulated(verbose)
+
         steps = tower_of_hanoi(self.n)
         if verbose:
             print(self)
@@ -76,6 +136,104 @@ class TowerOfHanoi:
         else:
             return False
 
+    def _evaluate_simulated(self, verbose=True):
+        simulator = HanoiSimulator(self.n)
+        offset = 0
+        for moves in iter_tower_of_hanoi_chunks(self.n):
+            failed_at = simulator.run(moves)
+            if failed_at != -1:
+                if verbose:
+                    print(f'Illegal move at index {offset + failed_at}: {moves[failed_at].tolist()}')
+                return False
+            offset += len(moves)
+        self.state = simulator.to_state()
+        if simulator.is_solved():
+            if verbose:
+                print(f'Success! Validated {offset} moves')
+            return True
+        return False
+
+
+class HanoiSimulator:
+    """ Compact Tower of Hanoi state for validating long move sequences
+
+    Pegs are numbered 0 = source, 1 = aux, 2 = dest. positions[r] holds the peg of
+    ring r, and masks[p] has bit r set for every ring on peg p. Smaller rings always
+    sit on top, so the top of a peg is the lowest set bit of its mask and every move
+    is validated in O(1)
+    """
+    PEGS = ('source', 'aux', 'dest')
+
+    def __init__(self, n: int):
+        self.n = n
+        self.positions = bytearray(n + 1)  # Indexed by ring (1-based). All start on source
+        self.masks = [((1 << n) - 1) << 1, 0, 0]
+
+    def __repr__(self):
+        return repr(self.to_state())
+
+    def to_state(self) -> dict:
+        """ Equivalent of TowerOfHanoi.state """
+        return {
+            peg: [ring for ring in range(self.n, 0, -1) if self.masks[p] >> ring & 1]
+            for p, peg in enumerate(self.PEGS)
+        }
+
+    def is_solved(self) -> bool:
+        return self.masks[2] == ((1 << self.n) - 1) << 1
+
+
+    def move(self, ring: int, from_: int, to_: int) -> bool:
+        """ Apply a move if it is legal, returning whether it was """
+        if from_ == to_:
+            return False
+        bit = 1 << ring
+        mask_from = self.masks[from_]
+        if mask_from & -mask_from != bit:  # Ring is not on top of from_ (or it is empty)
+            return False
+        mask_to = self.masks[to_]
+        if mask_to and mask_to & -mask_to < bit:  # Would land on a smaller ring
+            return False
+
+        self.masks[from_] = mask_from ^ bit
+        self.masks[to_] = mask_to | bit
+        self.positions[ring] = to_
+        return True
+
+
+    def run(self, moves) -> int:
+        """ Apply a batch of (ring, from, to) moves, e.g. an (k, 3) integer array
+
+        Stops at the first illegal move and returns its index within the batch, or
+        -1 if every move was legal. Out-of-range rings and pegs are rejected up front
+        """
+        n_valid = None  # Length of the prefix that passed the vectorized range check
+        if hasattr(moves, 'tolist'):
+            np = require_numpy()
+            moves = np.asarray(moves)
+            invalid = ((moves[:, 0] < 1) | (moves[:, 0] > self.n)
+                       | (moves[:, 1:] < 0).any(axis=1) | (moves[:, 1:] > 2).any(axis=1))
+            n_valid = int(np.argmax(invalid)) if invalid.any() else len(moves)
+            # Column-wise tolist is much cheaper than building a list per row
+            moves = zip(*(moves[:n_valid, col].tolist() for col in range(3)))
+
+        # Same checks as move, inlined since this loop is the hot path
+        masks, positions = self.masks, self.positions
+        for i, (ring, from_, to_) in enumerate(moves):
+            if n_valid is None and not (1 <= ring <= self.n and 0 <= from_ <= 2 and 0 <= to_ <= 2):
+                return i
+            bit = 1 << ring
+            mask_from, mask_to = masks[from_], masks[to_]
+            if (from_ == to_ or mask_from & -mask_from != bit
+                    or (mask_to and mask_to & -mask_to < bit)):
+                return i
+            masks[from_] = mask_from ^ bit
+            masks[to_] = mask_to | bit
+            positions[ring] = to_
+        if n_valid is not None and n_valid < len(invalid):
+            return n_valid
+        return -1
+
 
 def family_structure_with_deterministic_children(n: int, k: int):
     """ Determine gender of k-th child in n-th generation
@@ -96,6 +254,55 @@ def family_structure_with_deterministic_children(n: int, k: int):
     return 'F'
 
 
+def family_structure_closed_form(n: int, k: int) -> str:
+    """ O(1) version of family_structure_with_deterministic_children
+
+    Written in binary, the bits of k-1 trace the path from the root: bit 0 means
+    first child, which keeps the parent's gender, and bit 1 means second child,
+    which flips it. So the gender is just the parity of the set bits in k-1
+    """
+    if k < 1 or (k - 1).bit_length() >= n:
+        raise ValueError(f'Generation {n} has no child {k}')
+    return 'F' if (k - 1).bit_count() & 1 else 'M'
+
+
+def _parity(np, x):
+    # Parity of set bits of each element of a uint64 array
+    if hasattr(np, 'bitwise_count'):  # NumPy >= 2.0
+        return np.bitwise_count(x) & 1
+    # Otherwise fold the word onto itself: the low bit ends up as the XOR of all bits
+    x = x.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        x ^= x >> np.uint64(shift)
+    return x & np.uint64(1)
+
+
+def family_structure_batch(n, k, backend: str = None):
+    """ Vectorized family_structure_closed_form over arrays of (n, k) queries
+
+    Returns an array of 'M'/'F'. k values that don't fit in uint64 fall back to
+    Python ints (and int.bit_count), element by element. The 'python' backend takes
+    sequences of equal length and returns a list
+    """
+    if resolve(backend) == PYTHON:
+        return [family_structure_closed_form(gen, child) for gen, child in zip(n, k)]
+
+    np = require_numpy()
+    n, k = np.broadcast_arrays(np.asarray(n), np.asarray(k))
+    if k.dtype.kind == 'O' or k.dtype.kind == 'f':
+        parity = np.array([family_structure_closed_form(int(gen), int(child)) == 'F'
+                           for gen, child in zip(n.ravel().tolist(), k.ravel().tolist())])
+        return np.where(parity.reshape(k.shape), 'F', 'M')
+
+    if (k < 1).any() or (n < 1).any():
+        raise ValueError('Generations and child indices are 1-based')
+    offset = k.astype(np.uint64) - np.uint64(1)
+    # The (0-based) child offset must fit in n-1 bits
+    if (n < 64).any() and (offset[n < 64] >> n[n < 64].astype(np.uint64) - np.uint64(1)).any():
+        raise ValueError('Some generations have fewer children than requested')
+    return np.where(_parity(np, offset).astype(bool), 'F', 'M')
+
+
 class MinCostPath:
     """ Various implementations of a minimum-cost path for matrix traversal
 
@@ -106,12 +313,12 @@ class MinCostPath:
     """
     def __init__(self, costs, allow_diagonal_move: bool = True):
         if isinstance(costs, list):
-            costs = np.array(costs)
+            costs = require_numpy().array(costs)
 
         self.costs = costs
         self.allow_diagonal_move = allow_diagonal_move
 
-        self._max_cost = np.inf
+        self._max_cost = float('inf')
 
 
     def solve_recursive(self, m=None, n=None):
@@ -140,7 +347,7 @@ class MinCostPath:
             n = self.costs.shape[1] - 1
             # Assume that all distances are non-negative, so we can simply check if
             # cache = -1 (another method is to just use dict keys)
-            self._costs_from_origin = -np.ones_like(self.costs)
+            self._costs_from_origin = -require_numpy().ones_like(self.costs)
             self._costs_from_origin[0, 0] = self.costs[0, 0]  # Base case
 
         if m < 0 or n < 0:  # Out-of-bounds
@@ -158,26 +365,145 @@ class MinCostPath:
         return current_cost
 
 
-    def solve_dp(self):
+    @classmethod
+    def from_file(cls, path, shape: tuple, dtype='float64', allow_diagonal_move: bool = True):
+        """ Solve over a raw cost matrix on disk, without loading it into memory
+
+        The file is memory-mapped, and solve_dp only ever reads one row at a time,
+        so memory use is O(n) for the DP itself (O(mn) bytes with return_path)
+        """
+        np = require_numpy()
+        return cls(np.memmap(path, dtype=dtype, mode='r', shape=shape), allow_diagonal_move)
+
+
+    # Codes for the move into each cell, used to reconstruct the path
+    _START, _UP, _LEFT, _DIAGONAL = 0, 1, 2, 3
+
+
+    def solve_dp(self, return_path: bool = False):
         # This is technically the same as memoization, but constructs the cost from origin
         # matrix directly (in a "bottom-up" vs "top-down") approach
         # Using this approach it is easy to see complexity is reduced to O(mn)
-        costs_from_origin = np.zeros_like(self.costs)
-        costs_from_origin[0, 0] = self.costs[0, 0]  # Base case
-
-        # Fill the first row and column with allowed movement costs (e.g. straight down/right)
-        for i in range(1, self.costs.shape[0]):
-            costs_from_origin[i, 0] = costs_from_origin[i-1, 0] + self.costs[i, 0]
-        for j in range(1, self.costs.shape[1]):
-            costs_from_origin[0, j] = costs_from_origin[0, j-1] + self.costs[0, j]
-
-        # Fill rest of the array
-        for i in range(1, self.costs.shape[0]):
-            for j in range(1, self.costs.shape[1]):
-                costs_from_origin[i, j] = self.costs[i, j] + min(
-                    costs_from_origin[i-1, j],
-                    costs_from_origin[i, j-1],
-                    costs_from_origin[i-1, j-1] if self.allow_diagonal_move else self._max_cost,
-                )
-
-        return costs_from_origin[-1, -1]
+
+        # Each row only depends on the previous one, so only two rows are kept. Up and
+        # diagonal moves come from the previous row and vectorize directly. Left moves
+        # are a recurrence within the row:
+        #     row[j] = min(base[j], row[j-1] + costs[i, j])
+        # With P the prefix sums of costs[i], this is row[j] - P[j] =
+        # min(base[j] - P[j], row[j-1] - P[j-1]), i.e. a cumulative min (np.minimum.accumulate).
+        # That is exact for integers only: with floats, subtracting and adding back P
+        # cancels (a 1e16 cell wipes out the small ones) and gives inf - inf = nan.
+        # Floats instead use a doubling scan (see _left_moves), which only ever adds.
+        np = require_numpy()
+        m, n = self.costs.shape
+        dtype = np.int64 if self.costs.dtype.kind in 'biu' else np.float64
+        moves = np.empty((m, n), dtype=np.uint8) if return_path else None
+
+        costs_from_origin = np.cumsum(self.costs[0], dtype=dtype)  # Only left moves in row 0
+        if return_path:
+            moves[0, 0] = self._START
+            moves[0, 1:] = self._LEFT
+
+        for i in range(1, m):
+            row_costs = np.asarray(self.costs[i], dtype=dtype)
+            prev = costs_from_origin
+            base = prev.copy()  # Best arrival from above
+            if self.allow_diagonal_move:
+                np.minimum(prev[1:], prev[:-1], out=base[1:])
+            base += row_costs
+
+            if dtype == np.int64:
+                prefix = np.cumsum(row_costs)
+                shifted = base - prefix
+                costs_from_origin = np.minimum.accumulate(shifted)
+                left = costs_from_origin < shifted
+                costs_from_origin += prefix
+            else:
+                costs_from_origin = _left_moves(np, base, row_costs)
+                left = costs_from_origin < base
+
+            if return_path:
+                moves[i] = self._UP
+                if self.allow_diagonal_move:
+                    moves[i, 1:][prev[:-1] < prev[1:]] = self._DIAGONAL
+                moves[i][left] = self._LEFT
+
+        if return_path:
+            return costs_from_origin[-1], self._reconstruct_path(moves)
+        return costs_from_origin[-1]
+
+
+    def _reconstruct_path(self, moves) -> list:
+        # Walk back from the bottom-right corner, following the recorded moves
+        i, j = moves.shape[0] - 1, moves.shape[1] - 1
+        path = [(i, j)]
+        while moves[i, j] != self._START:
+            move = moves[i, j]
+            if move != self._LEFT:
+                i -= 1
+            if move != self._UP:
+                j -= 1
+            path.append((i, j))
+        path.reverse()
+        return path
+
+
+def _left_moves(np, base, row_costs):
+    # row[j] = min(base[j], row[j-1] + row_costs[j]) for every j, as a doubling scan:
+    # after the pass with offset k, row[j] is the best over arrivals from above at
+    # j-2k+1..j, and segment[j] the cost of the 2k cells ending at j. O(n log n) work
+    # in O(log n) vectorized passes, and never subtracts
+    row = base.copy()
+    segment = row_costs.copy()
+    k = 1
+    while k < len(row):
+        np.minimum(row[k:], row[:-k] + segment[k:], out=row[k:])
+        segment[k:] = segment[k:] + segment[:-k]
+        k *= 2
+    return row
+
+
+def batch_min_cost_path(costs, allow_diagonal_move: bool = True, blocked=None,
+                        chunk_size: int = 2**16):
+    """ Minimum cost of MinCostPath for a whole stack of cost matrices at once
+
+    :costs: has shape (batch, m, n), and :blocked: is an optional boolean mask of
+    cells that cannot be entered, broadcastable to the same shape. Unreachable
+    targets get a cost of inf.
+
+    Rather than looping over grids, this loops over cells and vectorizes across the
+    batch: the stack is transposed to (m, n, batch) so every cell is one contiguous
+    vector. For small grids that is only a few hundred NumPy calls per chunk,
+    however many grids there are. Chunks are sized to keep a row in cache
+    """
+    np = require_numpy()
+    costs = np.asarray(costs)
+    if costs.ndim != 3:
+        raise ValueError('costs must have shape (batch, m, n)')
+    batch, m, n = costs.shape
+
+    if blocked is None and costs.dtype.kind in 'biu':
+        dtype = np.int64
+    else:  # Blocked cells are represented as infinite cost
+        dtype = np.float64
+    result = np.empty(batch, dtype=dtype)
+
+    for lo in range(0, batch, chunk_size):
+        hi = min(lo + chunk_size, batch)
+        chunk = np.ascontiguousarray(costs[lo:hi].transpose(1, 2, 0), dtype=dtype)
+        if blocked is not None:
+            mask = np.broadcast_to(blocked, costs.shape)[lo:hi].transpose(1, 2, 0)
+            chunk[mask] = np.inf
+
+        row = np.cumsum(chunk[0], axis=0)  # First row: only left moves
+        for i in range(1, m):
+            prev = row
+            row = prev.copy()  # Best arrival from above
+            if allow_diagonal_move:
+                np.minimum(prev[1:], prev[:-1], out=row[1:])
+            row += chunk[i]
+            for j in range(1, n):
+                np.minimum(row[j], row[j-1] + chunk[i, j], out=row[j])
+        result[lo:hi] = row[-1]
+
+    return result
@@ -4,38 +4,324 @@ conditions. Typically they fall in two types:
 
 - Fixed window, e.g. max sum subarray of size k
 - Variable window, e.g. maximum subarray
+
+WindowAggregator maintains an aggregate (sum, distinct count, min or max) of either
+kind of window incrementally, over a stream that never needs to fit in memory
 """
+import operator
+from collections import deque
+from itertools import chain
+
+from algorithms.backend import PYTHON, require_numpy, resolve
+
+
+class _Sum:
+    def __init__(self):
+        self.total = 0
+
+    def add(self, x, i: int):
+        self.total += x
+
+    def remove(self, x, i: int):
+        self.total -= x
+
+    def value(self):
+        return self.total
+
+
+class _Distinct:
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, x, i: int):
+        self.counts[x] = self.counts.get(x, 0) + 1
+
+    def remove(self, x, i: int):
+        if self.counts[x] == 1:
+            del self.counts[x]
+        else:
+            self.counts[x] -= 1
+
+    def value(self):
+        return len(self.counts)
+
+
+class _Extreme:
+    """ Min (or max) of the window, via a monotonic deque of (index, value)
+
+    An element that is no better than a later one can never be the extreme again,
+    since it leaves the window first. Dropping those on arrival keeps the deque
+    sorted, with the extreme at its front, and each element is pushed and popped
+    at most once: O(1) amortized """
+    def __init__(self, better):
+        self.better = better
+        self.candidates = deque()
+
+    def add(self, x, i: int):
+        while self.candidates and not self.better(self.candidates[-1][1], x):
+            self.candidates.pop()
+        self.candidates.append((i, x))
+
+    def remove(self, x, i: int):
+        if self.candidates[0][0] == i:
+            self.candidates.popleft()
+
+    def value(self):
+        return self.candidates[0][1] if self.candidates else None
+
+
+_AGGREGATES = {
+    'sum': _Sum,
+    'distinct': _Distinct,
+    'min': lambda: _Extreme(operator.lt),
+    'max': lambda: _Extreme(operator.gt),
+}
+
+
+class WindowAggregator:
+    """ Aggregate of a window sliding over a stream, updated in O(1) amortized per element
+
+    The window is either:
+        - fixed: the last :size: elements. A result is emitted once it is full
+        - variable: after each element is added, the oldest ones are evicted while
+          shrink_while(aggregator) holds. A result is emitted for every element
+
+    :param aggregate: 'sum', 'distinct' (number of distinct elements), 'min' or 'max'
+    """
+    def __init__(self, aggregate: str = 'sum', size: int = None, shrink_while=None):
+        if aggregate not in _AGGREGATES:
+            raise ValueError(f'aggregate {aggregate!r} is not recognized. Expected one of {tuple(_AGGREGATES)}')
+        if (size is None) == (shrink_while is None):
+            raise ValueError('Exactly one of size and shrink_while must be given')
+        if size is not None and size < 1:
+            raise ValueError('size must be positive')
+        self.size = size
+        self.shrink_while = shrink_while
+        self._aggregate = _AGGREGATES[aggregate]()
+        self._window = deque()
+        self.start = 0  # Stream index of the window's oldest element
+        self.end = 0  # Stream index one past its newest
+
+    def __len__(self):
+        return len(self._window)
+
+    @property
+    def value(self):
+        return self._aggregate.value()
+
+    def push(self, x) -> bool:
+        """ Add the next element, evict as needed, and return whether a result is due """
+        self._window.append(x)
+        self._aggregate.add(x, self.end)
+        self.end += 1
+        if self.size is not None:
+            if len(self._window) > self.size:
+                self.pop()
+            return len(self._window) == self.size
+        while self._window and self.shrink_while(self):
+            self.pop()
+        return True
+
+    def pop(self):
+        """ Evict the oldest element """
+        self._aggregate.remove(self._window.popleft(), self.start)
+        self.start += 1
+
+    def feed(self, stream):
+        """ Yield the window's aggregate after each element of stream, once due """
+        push = self.push
+        for x in stream:
+            if push(x):
+                yield self._aggregate.value()
+
+    def feed_chunks(self, chunks):
+        """ feed over a stream delivered in chunks, e.g. NumPy arrays read piecewise """
+        return self.feed(chain.from_iterable(
+            chunk.tolist() if hasattr(chunk, 'tolist') else chunk for chunk in chunks))
 
 
 def subarray_sum_equals(array: list, s: int) -> list:
     """ Find a subarray with sum equal to s
 
-    Sliding window allows computation in O(n) vs O(n^2) by skipping repeat computations
+    Returns the first one to end (and of those, the longest), or [] if there is none.
+    See subarray_sum_matches, which this wraps, for the other matches
     """
-    # TODO: is there maybe a solution using deque?
-    n = len(array)
-    curr_sum = array[0]
-    window_start = 0
-    window_end = 1
-
-    # Iterate through window end pointer, sliding the window start pointer as needed
-    # The end pointer is responsible for appending new items, while the start pointer
-    # is responsible for culling old ones
-    while window_end <= n:
-        # If curr_sum exceeds s, then keep removing start points until it's below again
-        while curr_sum > s and window_start < window_end:
-            curr_sum -= array[window_start]
-            window_start += 1
+    # The scan stops at the first match, which usually beats a full NumPy pass
+    match = subarray_sum_matches(array, s, 'first', backend=PYTHON)
+    if match is None:
+        return []  # No valid subarray found
+    start, end = match
+    return array[start:end]
 
-        if curr_sum == s:
-            return array[window_start: window_end]
 
-        # Update current sum--but only if window_end is still a valid index!
-        if window_end < n:
-            curr_sum += array[window_end]
+SUBARRAY_SUM_MODES = ('first', 'shortest', 'all', 'count')
 
-        window_end += 1
-    return []  # No valid subarray found
+
+class PrefixSumMatcher:
+    """ Non-empty subarrays summing to s, over a stream fed in chunks
+
+    A sliding window only works for non-negative values: with negatives, growing
+    the window can decrease its sum. Instead, array[i:j] sums to s exactly when
+    prefix[j] - prefix[i] == s, where prefix[j] = sum(array[:j]). So for each end j,
+    a hash map of the prefix sums seen so far gives the matching starts in O(1):
+    O(n) overall, for any signs. Matches are (start, end) pairs of stream indices,
+    with end exclusive.
+
+    Modes, and what the map stores for each prefix sum:
+        'first': the match ending first (the longest, for that end). First index
+        'shortest': the shortest match (the first, on ties). Last index
+        'all': every match. All indices
+        'count': the number of matches. Number of indices
+
+    update(chunk) processes the next chunk. For 'all' it returns the matches ending
+    in that chunk, which are not retained, so unbounded streams can be consumed.
+    For the other modes, result holds the answer so far (None if no match yet)
+    """
+    def __init__(self, s, mode: str = 'all'):
+        if mode not in SUBARRAY_SUM_MODES:
+            raise ValueError(f'mode {mode!r} is not recognized. Expected one of {SUBARRAY_SUM_MODES}')
+        self.s = s
+        self.mode = mode
+        self.n = 0  # Elements seen so far
+        self.total = 0  # Their sum
+        self.result = 0 if mode == 'count' else None
+        # Index (or indices, or count) of each prefix sum, starting with the empty prefix
+        self._seen = {0: [0] if mode == 'all' else 1 if mode == 'count' else 0}
+
+    def update(self, chunk) -> list:
+        if hasattr(chunk, 'tolist'):  # NumPy arrays: iterate over Python scalars
+            chunk = chunk.tolist()
+        s, seen, total, j = self.s, self._seen, self.total, self.n
+        matches = []
+        if self.mode == 'first':
+            for x in chunk:
+                total += x
+                j += 1
+                if self.result is not None:  # Nothing can end any earlier: only count
+                    continue
+                start = seen.get(total - s)
+                if start is not None:
+                    self.result = (start, j)
+                    seen.clear()  # No longer needed
+                else:
+                    seen.setdefault(total, j)
+        elif self.mode == 'shortest':
+            best = self.result
+            for x in chunk:
+                total += x
+                j += 1
+                start = seen.get(total - s)
+                if start is not None and (best is None or j - start < best[1] - best[0]):
+                    best = (start, j)
+                seen[total] = j
+            self.result = best
+        elif self.mode == 'count':
+            count = self.result
+            for x in chunk:
+                total += x
+                j += 1
+                count += seen.get(total - s, 0)
+                seen[total] = seen.get(total, 0) + 1
+            self.result = count
+        else:
+            for x in chunk:
+                total += x
+                j += 1
+                starts = seen.get(total - s)
+                if starts:
+                    matches.extend((start, j) for start in starts)
+                if total in seen:
+                    seen[total].append(j)
+                else:
+                    seen[total] = [j]
+        self.total, self.n = total, j
+        return matches
+
+
+def subarray_sum_matches(array, s, mode: str = 'all', backend: str = None):
+    """ Non-empty subarrays of array summing to s, as (start, end) pairs (end exclusive)
+
+    :param mode: 'first' or 'shortest' (a pair, or None), 'all' (a list of pairs,
+        ordered by end then start) or 'count'. See PrefixSumMatcher
+    """
+    if resolve(backend) == PYTHON:
+        matcher = PrefixSumMatcher(s, mode)
+        matches = matcher.update(array)
+        return matches if mode == 'all' else matcher.result
+    if mode not in SUBARRAY_SUM_MODES:
+        raise ValueError(f'mode {mode!r} is not recognized. Expected one of {SUBARRAY_SUM_MODES}')
+
+    # Same matches, found for every end at once. Each start i is keyed by
+    # (prefix[i], i) and each end j by (prefix[j] - s, j), so that after one sort,
+    # the starts matching end j (i < j with prefix[i] == prefix[j] - s) are exactly
+    # the starts between the beginning of j's run of equal values and j itself
+    np = require_numpy()
+    prefix = _prefix_sums(np, np.asarray(array))
+    if prefix.dtype == np.int64 and abs(s) >= 2**62:
+        prefix = prefix.astype(object)  # prefix - s could overflow
+    n = len(prefix)  # One more than the number of elements
+    values = np.concatenate([prefix, prefix[1:] - s])
+    index = np.concatenate([np.arange(n), np.arange(1, n)])
+    is_start = np.zeros(len(values), dtype=bool)
+    is_start[:n] = True
+    # Rank values (by offsetting them when that cannot overflow, which saves a sort).
+    # At equal value and index, the end sorts first, which rules out empty subarrays
+    if values.dtype == np.int64 and int(values.max()) - int(values.min()) < 2**62 // n:
+        ranks = values - values.min()
+    else:
+        ranks = np.unique(values, return_inverse=True)[1].astype(np.int64).ravel()
+    order = np.argsort(ranks * (2 * n) + 2 * index + is_start)
+    ranks, index, is_start = ranks[order], index[order], is_start[order]
+
+    # Starts preceding each entry in sorted order, and preceding the entry's run
+    starts_before = np.cumsum(is_start) - is_start
+    run_begins = np.ones(len(ranks), dtype=bool)
+    run_begins[1:] = ranks[1:] != ranks[:-1]
+    run_start = np.maximum.accumulate(np.where(run_begins, np.arange(len(ranks)), 0))
+    is_end = ~is_start
+    ends = index[is_end]
+    lo = starts_before[run_start][is_end]
+    hi = starts_before[is_end]
+    counts = hi - lo
+    sorted_starts = index[is_start]  # Matching starts of an end are sorted_starts[lo:hi]
+
+    if mode == 'count':
+        return int(counts.sum())
+    if mode == 'all':
+        by_end = np.argsort(ends)
+        ends, lo, counts = ends[by_end], lo[by_end], counts[by_end]
+        # Index of each match within its run, to offset from the run's first start
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        starts = sorted_starts[np.repeat(lo, counts) + offsets]
+        return list(zip(starts.tolist(), np.repeat(ends, counts).tolist()))
+    matched = np.flatnonzero(counts)
+    if len(matched) == 0:
+        return None
+    if mode == 'first':
+        j = matched[np.argmin(ends[matched])]
+        return int(sorted_starts[lo[j]]), int(ends[j])
+    # Shortest: the last start of each run. Ties go to the earliest end
+    starts = sorted_starts[hi[matched] - 1]
+    lengths = ends[matched] - starts
+    shortest = np.flatnonzero(lengths == lengths.min())
+    j = shortest[np.argmin(ends[matched[shortest]])]
+    return int(starts[j]), int(ends[matched[j]])
+
+
+def _prefix_sums(np, array):
+    # [0, array[0], array[0] + array[1], ...], exactly. int64 when the sums provably
+    # fit (|sum| <= n * max|x|) with a bit to spare, so that the difference of two
+    # sums also fits. Python ints in an object array otherwise
+    if array.dtype.kind in 'iu' and len(array):
+        bound = max(abs(int(array.min())), abs(int(array.max()))) * len(array)
+        dtype = np.int64 if bound < 2**62 else object
+    elif array.dtype.kind in 'iu' or array.dtype.kind == 'b':
+        dtype = np.int64
+    else:
+        dtype = np.float64 if array.dtype.kind == 'f' else object
+    prefix = np.zeros(len(array) + 1, dtype=dtype)
+    np.cumsum(array.astype(dtype), out=prefix[1:])
+    return prefix
 
 
 def smallest_subarray_with_k_distinct(array: list, k: int) -> list:
@@ -88,30 +374,193 @@ def equilibrium_indices(array: list) -> list:
 
     An equilibrium index is defined as i s.t. sum(array[:i]) == sum(array[i+1:])
     """
-    # Bit of a hack here, but the initialization + the loop (where left_sum is first
-    # incremented before comparison, and right_sum is decremented *after* comparison),
-    # means we are properly comparing array[:i] to array[i+1:]
-    right_sum = sum(array[1:])
-    left_sum = -array[0]
-
+    # i is an equilibrium index iff left_sum == total - left_sum - array[i], where
+    # left_sum is the sum of array[:i]
+    total = sum(array)
+    left_sum = 0
     indices = []
-    for i in range(len(array)):
-        left_sum += array[i]
-        if left_sum == right_sum:
+    for i, x in enumerate(array):
+        if 2 * left_sum + x == total:
             indices.append(i)
-        right_sum -= array[i]
+        left_sum += x
     return indices
 
 
+def equilibrium_indices_vectorized(array):
+    """ equilibrium_indices via one cumsum, returning an array of indices
+
+    Sums are exact: int64 when they provably fit, Python ints otherwise
+    """
+    np = require_numpy()
+    array = np.asarray(array)
+    return _equilibrium_in_chunk(np, array, _exact_sum(np, array), 0)
+
+
+def equilibrium_indices_streaming(source, dtype=None, chunk_size: int = 2**20):
+    """ equilibrium_indices over an array too large for memory, in bounded memory
+
+    Two passes over chunks: the first one sums the array, and the second carries
+    the running left sum across chunks and yields each chunk's equilibrium indices.
+
+    :param source: a path to a raw binary file of :dtype: values (memory-mapped), or
+        any array-like supporting len and slicing, e.g. an existing np.memmap
+    :return: generator of arrays of indices, in increasing order
+    """
+    np = require_numpy()
+    if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+        source = np.memmap(source, dtype=dtype, mode='r')
+    n = len(source)
+    total = 0
+    for start in range(0, n, chunk_size):
+        total += _exact_sum(np, np.asarray(source[start:start + chunk_size]))
+    left_sum = 0
+    for start in range(0, n, chunk_size):
+        chunk = np.asarray(source[start:start + chunk_size])
+        indices = _equilibrium_in_chunk(np, chunk, total - 2 * left_sum, start)
+        if len(indices):
+            yield indices
+        left_sum += _exact_sum(np, chunk)
+
+
+def _exact_sum(np, array) -> int:
+    prefix = _prefix_sums(np, array)
+    return prefix[-1].item() if prefix.dtype != object else prefix[-1]
+
+
+def _equilibrium_in_chunk(np, chunk, target, offset: int):
+    # Indices i (plus offset) where 2 * sum(chunk[:i]) + chunk[i] == target, i.e.
+    # prefix[i] + prefix[i+1] == target. target is a Python int (or float)
+    prefix = _prefix_sums(np, chunk)
+    if prefix.dtype == np.int64 and abs(target) >= 2**62:
+        prefix = prefix.astype(object)  # target - prefix could overflow
+    if prefix.dtype == object:
+        target_array = target
+    else:
+        target_array = prefix.dtype.type(target)
+    return np.flatnonzero(prefix[:-1] == target_array - prefix[1:]) + offset
+
+
 def count_distinct_element_in_k_size_window(array: list, k: int) -> list:
     """ Given an array, count number of distinct elements in a sliding window of size k
     """
-    # TODO
+    return list(WindowAggregator('distinct', size=k).feed(array))
 
 
 def substring_anagrams(string: str, substring: str) -> list:
     """ Given string and substring, return all indices of string that are anagrams of substring
 
     For example, if string is "subbusbam", and substring is "sub", then indices
-    are at 0, 3, 4 """
-    # TODO
\ No newline at end of file
+    are at 0, 3, 4
+
+    O(n): the window slides one symbol at a time, updating diff (window count minus
+    substring count, per symbol) and the number of symbols whose diff is non-zero.
+    The window is an anagram whenever that number is 0. Works on any sequences,
+    e.g. str or bytes
+    """
+    m = len(substring)
+    if m == 0:
+        return list(range(len(string) + 1))
+    diff = {}
+    for c in substring:
+        diff[c] = diff.get(c, 0) - 1
+    mismatched = len(diff)
+
+    indices = []
+    for i, c in enumerate(string):
+        d = diff.get(c, 0)
+        if d == 0:
+            mismatched += 1
+        elif d == -1:
+            mismatched -= 1
+        diff[c] = d + 1
+        if i >= m:  # The oldest symbol leaves the window
+            c = string[i - m]
+            d = diff[c]
+            if d == 0:
+                mismatched += 1
+            elif d == 1:
+                mismatched -= 1
+            diff[c] = d - 1
+        if mismatched == 0 and i >= m - 1:
+            indices.append(i - m + 1)
+    return indices
+
+
+def anagram_search(text, patterns, chunk_size: int = 2**20) -> dict:
+    """ Start indices of the anagrams of each pattern in text, in one pass
+
+    Every symbol is hashed to a pseudo-random 64-bit weight, and a window's
+    signature is the sum of its weights (mod 2**64): the same for all orderings
+    of the same symbols, and computed for every window at once from a cumsum.
+    Windows whose signature is a pattern's are then verified exactly, by comparing
+    sorted symbols, so hash collisions cannot produce false matches.
+
+    :param text: str, or anything exposing bytes through the buffer protocol
+        (bytes, bytearray, mmap.mmap, a uint8 np.memmap...), which is not copied
+    :param patterns: same-length patterns, of the same kind as text
+    :param chunk_size: windows processed at a time, which bounds memory
+    :return: {pattern: sorted int64 array of start indices}
+    """
+    np = require_numpy()
+    patterns = list(patterns)
+    if len({len(pattern) for pattern in patterns}) > 1:
+        raise ValueError('patterns must all have the same length')
+    codes = _symbol_codes(np, text)
+    m = len(patterns[0]) if patterns else 0
+    if m == 0 or m > len(codes):
+        return {pattern: (np.arange(len(codes) + 1) if m == 0 else np.empty(0, dtype=np.int64))
+                for pattern in patterns}
+
+    # Patterns that are anagrams of each other share their sorted symbols, and matches
+    groups = {}
+    for pattern in patterns:
+        canonical = np.sort(_symbol_codes(np, pattern))
+        groups.setdefault(canonical.tobytes(), (canonical, []))[1].append(pattern)
+    canonicals = np.array([canonical for canonical, _ in groups.values()])
+    signatures = _symbol_weights(np, canonicals).sum(axis=1, dtype=np.uint64)
+    order = np.argsort(signatures)
+    signatures, canonicals = signatures[order], canonicals[order]
+    members = [list(groups.values())[g][1] for g in order]
+
+    found = [[] for _ in members]
+    offsets = np.arange(m)
+    for start in range(0, len(codes) - m + 1, chunk_size):
+        window_codes = np.asarray(codes[start:start + chunk_size + m - 1])
+        cumulative = np.zeros(len(window_codes) + 1, dtype=np.uint64)
+        np.cumsum(_symbol_weights(np, window_codes), out=cumulative[1:])  # Wraps mod 2**64
+        window_signatures = cumulative[m:] - cumulative[:-m]
+        group = np.minimum(np.searchsorted(signatures, window_signatures), len(signatures) - 1)
+        hits = np.flatnonzero(signatures[group] == window_signatures)
+        if len(hits) == 0:
+            continue
+        group = group[hits]
+        exact = (np.sort(window_codes[hits[:, None] + offsets], axis=1) == canonicals[group]).all(axis=1)
+        hits, group = hits[exact] + start, group[exact]
+        for g in np.unique(group):
+            found[g].append(hits[group == g])
+
+    result = {}
+    for patterns_in_group, hits in zip(members, found):
+        indices = np.concatenate(hits) if hits else np.empty(0, dtype=np.int64)
+        for pattern in patterns_in_group:
+            result[pattern] = indices
+    return result
+
+
+def _symbol_codes(np, text):
+    # Symbols of text as an array of ints: code points of a str, bytes otherwise
+    if isinstance(text, str):
+        return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    if isinstance(text, np.ndarray):
+        return text.view(np.uint8).ravel()
+    return np.frombuffer(text, dtype=np.uint8)
+
+
+def _symbol_weights(np, codes):
+    # Pseudo-random 64-bit weight of each symbol code (splitmix64's finalizer)
+    if codes.dtype == np.uint8:  # Cheaper to look the 256 possible weights up
+        return _symbol_weights(np, np.arange(256, dtype=np.uint32))[codes]
+    z = codes.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
@@ -5,6 +5,8 @@ from __future__ import annotations
 
 import sys
 
+from datastructs.heap import CrudeHeap
+
 
 def _swap(arr: list, i: int, j: int):
     # Python allows assignment without needing to explicitly create temp variable
@@ -208,8 +210,5 @@ def heap_sort(array: list[int]) -> list[int]:
     Space complexity: O(1)
     Stable: no
     """
-    # HACK: Don't let broken code here break entire module :(
-    from datastructs.heap import CrudeHeap
-
     heap = CrudeHeap.heapify(array)
     return [heap.pop() for _ in array]
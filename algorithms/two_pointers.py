@@ -6,7 +6,13 @@ Within this class there are two basic solution types: equi-directional (both
 arrays start at one end) and opposite-directional (opposite ends and termination
 condition is when they meet)
 """
+import mmap
+import numbers
 import sys
+from bisect import bisect_left
+from itertools import groupby
+
+from algorithms.backend import PYTHON, require_numpy, resolve
 
 
 def minimum_subarray_with_given_product(array: list, p: int) -> int:
@@ -15,33 +21,155 @@ def minimum_subarray_with_given_product(array: list, p: int) -> int:
     Solution is in O(n). The key is that if we find the minimum subarray starting
     at i (and say it terminates at j), then we know that the solution for minimum
     subarray starting at i+1 *must* terminate *after* j, which satisfies monotonicity!
+
+    Values must be non-negative integers (TypeError otherwise): factors below 1
+    would shrink the product as the window grows, which breaks monotonicity.
+    Products are exact integers, bounded by p times the window's first and last
+    elements, and shrinking the window is an exact division. A zero zeroes every
+    window containing it, so the array is split into zero-free segments, each
+    scanned with its own pair of pointers
     """
+    array = _as_factors(array)
     n = len(array)
+    if n and p <= 0:
+        return 1  # Every product is >= 0
 
-    cur_product = 1
     min_size = sys.maxsize
+    i = 0  # Equi-directional
+    cur_product = 1
+    for j in range(n):
+        if array[j] == 0:
+            # Start over past the zero
+            i, cur_product = j + 1, 1
+            continue
+        cur_product *= array[j]
+        # Drop elements from the start while the product stays >= p: this finds the
+        # minimum subarray *ending* at j. The start never has to move back
+        while i < j and cur_product // array[i] >= p:
+            cur_product //= array[i]
+            i += 1
+        if cur_product >= p:
+            min_size = min(min_size, j - i + 1)
 
-    i = j = 0  # Equi-directional
-    while i < n:  # Termination condition: end of array for pointer i
-        # Solve for minimum subarray *beginning* at i
-        while j < n and cur_product < p:
-            # Only enter this block (incrementing j) *if* cur_product is smaller than p
-            # Otherwise, you want to keep incrementing i (and decreasing cur_product)
-            # until you are once again below
-            cur_product *= array[j]
-            j += 1
+    if min_size == sys.maxsize:
+        # Add some validation for unreasonable p's
+        raise ValueError('p is unsatisfiable given array!')
+    return min_size
 
-            if j == n and cur_product < p:
-                # Add some validation for unreasonable p's
-                raise ValueError('p is unsatisfiable given array!')
 
-        if cur_product >= p:
-            min_size = min(min_size, j - i)
+def _as_factors(array) -> list:
+    # Validated Python ints, so products never overflow (e.g. NumPy int64 elements)
+    factors = list(array)
+    if not all(type(x) is int for x in factors):  # Cheap check first: ABCs are slow
+        for x in factors:
+            if not isinstance(x, numbers.Integral):
+                raise TypeError(f'array must hold integers, not {type(x).__name__}')
+        factors = [int(x) for x in factors]
+    if factors and min(factors) < 0:
+        raise ValueError('array must be non-negative')
+    return factors
 
-        cur_product /= array[i]
-        i += 1
 
-    return min_size
+class ProductThresholdIndex:
+    """ Answer minimum_subarray_with_given_product for many p over the same array
+
+    The answer for p is the smallest L such that some subarray of length L has a
+    product >= p. So with _best[L-1] the largest product among subarrays of length
+    at most L, which is nondecreasing in L, every query is a bisection. The table is
+    extended lazily, one length at a time, only as far as queries need.
+
+    Each length takes one O(n) pass, which multiplies the exact products of the
+    windows of the previous length by the element that follows them. The 'numpy'
+    backend does that pass vectorized, in int64 while the products provably fit and
+    on Python ints (object arrays) past that, so the table holds exact ints either way
+    """
+    def __init__(self, array: list):
+        self.values = _as_factors(array)  # Same contract as minimum_subarray_with_given_product
+        self.n = len(self.values)
+        self._best = []
+        # Exact products of the windows of length len(self._best): a list, or a NumPy
+        # array once the 'numpy' backend has extended the table
+        self._products = None
+        self._array = None
+
+
+    def _extend(self, p, budget: int, backend: str = None):
+        # Add lengths while the largest product is < p, at most budget of them
+        values, n, best = self.values, self.n, self._best
+        stop = min(n, len(best) + budget)
+        if resolve(backend) == PYTHON:
+            products = self._products
+            if products is not None and not isinstance(products, list):
+                products = products.tolist()
+            while len(best) < stop and (not best or best[-1] < p):
+                size = len(best) + 1  # Length of the windows added now
+                if products is None:
+                    products = list(values)
+                else:
+                    products = [products[i] * values[i+size-1] for i in range(n - size + 1)]
+                best.append(max(best[-1:] + products))
+            self._products = products
+            return
+
+        np = require_numpy()
+        if self._array is None:
+            array = np.asarray(values)
+            if array.dtype.kind in 'iu' and (not n or array.max() < 2**62):
+                self._array = array.astype(np.int64)
+            else:  # Python scalars, with Python arithmetic
+                self._array = np.array(values, dtype=object)
+        array, products = self._array, self._products
+        if isinstance(products, list):
+            products = np.array(products, dtype=object)
+        largest_value = max(values, default=0)
+        while len(best) < stop and (not best or best[-1] < p):
+            size = len(best) + 1
+            if products is None:
+                products = array.copy()
+            else:
+                if products.dtype != object and best[-1] * largest_value >= 2**63:
+                    # The next products could overflow int64
+                    products, array = products.astype(object), array.astype(object)
+                products = products[:-1] * array[size-1:]
+            largest = products.max()
+            largest = largest.item() if hasattr(largest, 'item') else largest
+            best.append(max(best[-1], largest) if best else largest)
+        self._products = products
+
+
+    def query(self, p, backend: str = None) -> int:
+        answer, = self.query_many([p], backend)
+        if answer is None:
+            raise ValueError('p is unsatisfiable given array!')
+        return answer
+
+
+    def query_many(self, ps: list, backend: str = None) -> list:
+        """ Answer a batch of p values, with None for those no subarray reaches
+
+        A batch of q values extends the table by at most q lengths, one O(n) pass
+        each, so building it never costs more than scanning the array once per
+        query. Queries within the table are then a bisection, O(log n), and those
+        beyond it fall back to minimum_subarray_with_given_product's O(n) scan. So a
+        batch costs O(n * min(q, L) + q log n), with L the table length it needs, and
+        O(q log n) once the table is long enough
+        """
+        if len(ps):
+            self._extend(max(ps), len(ps), backend)
+        best = self._best
+        answers = []
+        for p in ps:
+            size = bisect_left(best, p) + 1
+            if size <= len(best):
+                answers.append(size)
+            elif len(best) == self.n:  # No subarray at all reaches p
+                answers.append(None)
+            else:
+                try:
+                    answers.append(minimum_subarray_with_given_product(self.values, p))
+                except ValueError:
+                    answers.append(None)
+        return answers
 
 
 def find_exact_pairwise_sum(array: list, s: sum) -> tuple:
@@ -62,17 +190,208 @@ def find_exact_pairwise_sum(array: list, s: sum) -> tuple:
     return None
 
 
-def longest_mountain_subarray(array: list) -> int:
+def longest_mountain_subarray(array, backend: str = None) -> int:
     """ Given an array, return length of longest "mountain" subarray
 
     A mountain subarray is one composed of strictly increasing values followed
-    by strictly decreasing values
+    by strictly decreasing values (at least one of each, so it has length >= 3).
+    0 if there is none.
+
+    :param array: any iterable of comparable values. The 'python' backend consumes
+        it lazily, in one pass
     """
+    scanner = MountainScanner(backend)
+    scanner.update(array)
+    return scanner.result
+
+
+class MountainScanner:
+    """ longest_mountain_subarray over a stream fed in chunks
+
+    One pass, with O(1) state carried from element to element, and so across
+    chunks: the last value, and the steps taken by the current ascent and by the
+    descent following it. A mountain is as long as its ascent and descent plus one.
+
+    The 'numpy' backend processes each chunk at once: comparing each value with the
+    previous one gives steps (+1 up, -1 down, 0 flat), which are run-length
+    encoded, and every run of +1 directly followed by a run of -1 is a maximal
+    mountain. The state carried in is prepended as runs of its own.
+
+    update(chunk) processes the next chunk: a list, a NumPy array, or bytes (as
+    unsigned bytes). result holds the answer so far
+    """
+    def __init__(self, backend: str = None):
+        self.backend = resolve(backend)
+        self.result = 0
+        self._last = None  # Last value seen
+        self._up = self._down = 0  # Steps of the current ascent, and of its descent
+
+    def update(self, chunk):
+        if self.backend == PYTHON:
+            if hasattr(chunk, 'tolist'):  # NumPy arrays: iterate over Python scalars
+                chunk = chunk.tolist()
+            last, up, down, best = self._last, self._up, self._down, self.result
+            for x in chunk:
+                if last is not None:
+                    if x > last:
+                        if down:  # A new ascent starts at the foot of the last descent
+                            up = down = 0
+                        up += 1
+                    elif x < last:
+                        if up:  # Descending without an ascent is no mountain
+                            down += 1
+                            if up + down + 1 > best:
+                                best = up + down + 1
+                    else:
+                        up = down = 0
+                last = x
+            self._last, self._up, self._down, self.result = last, up, down, best
+            return
+
+        np = require_numpy()
+        if isinstance(chunk, (bytes, bytearray, memoryview, mmap.mmap)):
+            values = np.frombuffer(chunk, dtype=np.uint8)
+        else:
+            values = np.asarray(chunk if hasattr(chunk, '__len__') else list(chunk))
+        if len(values) == 0:
+            return
+        # Comparisons rather than np.diff, which wraps around for unsigned dtypes
+        steps = (values[1:] > values[:-1]).astype(np.int8) - (values[1:] < values[:-1])
+        if self._last is not None:
+            first = values[0].item()
+            step = (first > self._last) - (first < self._last)
+            steps = np.concatenate([np.array([step], dtype=np.int8), steps])
+        self._last = values[-1].item()
+        if len(steps) == 0:
+            return
+
+        starts = np.flatnonzero(np.concatenate([[True], steps[1:] != steps[:-1]]))
+        kinds = steps[starts]
+        lengths = np.diff(np.append(starts, len(steps)))
+        carried_kinds = [1, -1] if self._down else [1] if self._up else []
+        carried_lengths = [self._up, self._down][:len(carried_kinds)]
+        if carried_kinds and carried_kinds[-1] == kinds[0]:  # The run goes on
+            lengths[0] += carried_lengths.pop()
+            carried_kinds.pop()
+        if carried_kinds:
+            kinds = np.concatenate([np.array(carried_kinds, dtype=np.int8), kinds])
+            lengths = np.concatenate([np.array(carried_lengths, dtype=lengths.dtype), lengths])
+
+        peaks = np.flatnonzero((kinds[:-1] == 1) & (kinds[1:] == -1))
+        if len(peaks):
+            self.result = max(self.result, (lengths[peaks] + lengths[peaks + 1]).max().item() + 1)
+        if kinds[-1] == 1:
+            self._up, self._down = lengths[-1].item(), 0
+        elif kinds[-1] == -1 and len(kinds) > 1 and kinds[-2] == 1:
+            self._up, self._down = lengths[-2].item(), lengths[-1].item()
+        else:
+            self._up = self._down = 0
+
+
+def longest_mountain_streaming(source, dtype=None, chunk_size: int = 2**20, backend: str = None) -> int:
+    """ longest_mountain_subarray over an array too large for memory, in one pass
+
+    :param source: a path to a raw binary file of :dtype: values (memory-mapped), a
+        buffer (bytes, mmap.mmap, a NumPy array or np.memmap...) to read in chunks
+        of :chunk_size:, or any other iterable yielding chunks
+    """
+    if isinstance(source, str) or hasattr(source, '__fspath__'):
+        np = require_numpy()
+        source = np.memmap(source, dtype=dtype, mode='r')
+    scanner = MountainScanner(backend)
+    for chunk in _chunks(source, chunk_size):
+        scanner.update(chunk)
+    return scanner.result
+
+
+def _chunks(source, chunk_size: int):
+    # A str or buffer is cut into slices, any other iterable already yields chunks
+    if not isinstance(source, str):
+        try:
+            memoryview(source)
+        except TypeError:
+            return source
+    return (source[start:start + chunk_size] for start in range(0, len(source), chunk_size))
 
 
 def zero_sum_triplets(array: list) -> list:
     """ Given an array, return all distinct triplets that sum to zero """
+    return list(triplets_with_sum(sorted(array), 0))
+
+
+def triplets_with_sum(array: list, s):
+    """ Given sorted array, yield distinct (a, b, c), a <= b <= c, with a + b + c == s
+
+    O(n^2): for each a, find_exact_pairwise_sum's opposite-directional scan over the
+    rest of the array finds every (b, c). Runs of equal values are skipped after a
+    match, and for a, so every triplet of values is yielded once, in increasing order
+    """
+    n = len(array)
+    for i in range(n - 2):
+        a = array[i]
+        if i and array[i-1] == a:
+            continue
+        target = s - a
+        j, k = i + 1, n - 1
+        while j < k:
+            current_sum = array[j] + array[k]
+            if current_sum < target:
+                j += 1
+            elif current_sum > target:
+                k -= 1
+            else:
+                b, c = array[j], array[k]
+                yield a, b, c
+                while j < k and array[j] == b:
+                    j += 1
+                while j < k and array[k] == c:
+                    k -= 1
 
 
 def remove_consecutive_duplicates_string(string: str) -> str:
-    """ Remove consecutive duplicates """
\ No newline at end of file
+    """ Remove consecutive duplicates
+
+    Keeps each character that differs from the one before it. Works on any iterable
+    of characters, and joins once rather than concatenating character by character
+    """
+    return ''.join(c for c, _ in groupby(string))
+
+
+def remove_consecutive_duplicates_stream(source, chunk_size: int = 2**20, backend: str = None):
+    """ remove_consecutive_duplicates_string over text too large for memory
+
+    The last symbol of each chunk is carried over, so a run spanning chunks is still
+    collapsed to a single symbol. Deduplicated chunks are yielded as they are
+    produced, so out.writelines(remove_consecutive_duplicates_stream(...)) writes
+    through to a file without holding the result. With the 'numpy' backend a chunk's
+    kept symbols are found at once, by comparing it with itself shifted by one.
+
+    :param source: a str or buffer (bytes, mmap.mmap...) to read in chunks of
+        :chunk_size:, or any other iterable yielding str or bytes-like chunks, e.g.
+        iter(functools.partial(f.read, chunk_size), b'')
+    :return: generator of str chunks for str input, bytes otherwise
+    """
+    np = require_numpy() if resolve(backend) != PYTHON else None
+    last = None  # Last symbol so far: a character, or a byte as an int
+    for chunk in _chunks(source, chunk_size):
+        if not len(chunk):
+            continue
+        text = isinstance(chunk, str)
+        if np is None:
+            kept = [symbol for symbol, _ in groupby(chunk)]
+            if kept[0] == last:
+                del kept[0]
+            deduplicated = ''.join(kept) if text else bytes(kept)
+            last = chunk[-1]
+        else:
+            codes = np.frombuffer(chunk.encode('utf-32-le') if text else chunk,
+                                  dtype=np.uint32 if text else np.uint8)
+            keep = np.empty(len(codes), dtype=bool)
+            keep[0] = codes[0].item() != (ord(last) if text and last is not None else last)
+            np.not_equal(codes[1:], codes[:-1], out=keep[1:])
+            deduplicated = codes[keep].tobytes()
+            if text:
+                deduplicated = deduplicated.decode('utf-32-le')
+            last = chunk[-1] if text else codes[-1].item()
+        if deduplicated:
+            yield deduplicated
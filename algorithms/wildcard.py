@@ -0,0 +1,135 @@
+"""
+Compiled wildcard (glob) matching, for matching many strings against many patterns
+
+'?' matches any single character and '*' matches any (possibly empty) run of
+characters. See dp.wildcard_matching for the naive recursive version.
+
+Splitting a pattern on '*' gives literal segments (which may contain '?'). The
+first segment is anchored at the start of the string, the last at the end, and the
+ones in between only need to appear in order. Placing each middle segment at its
+leftmost occurrence is always safe: it leaves the most room for the segments after
+it. So no real backtracking is needed, and matching costs at most O(|s| * |p|), with
+the common '?'-free case running on str.find
+"""
+from functools import lru_cache
+
+
+def _matches_at(string: str, segment: str, i: int) -> bool:
+    # Compare segment against string[i:i+len(segment)], treating '?' as any character
+    for k, c in enumerate(segment):
+        if c != '?' and c != string[i + k]:
+            return False
+    return True
+
+
+def _longest_literal(segment: str) -> tuple:
+    # Longest '?'-free run in segment, along with its offset
+    best, best_offset, offset = '', 0, 0
+    for chunk in segment.split('?'):
+        if len(chunk) > len(best):
+            best, best_offset = chunk, offset
+        offset += len(chunk) + 1
+    return best, best_offset
+
+
+class CompiledPattern:
+    """ Pattern preprocessed into its literal segments
+
+    Repeated '*' collapse, since they produce empty segments in between
+    """
+    __slots__ = ('pattern', 'has_star', 'prefix', 'suffix', 'middle', 'min_length', 'required')
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        segments = pattern.split('*')
+        self.has_star = len(segments) > 1
+        self.prefix = segments[0]
+        self.suffix = segments[-1] if self.has_star else ''
+        # Each middle segment is kept with its longest literal, used to seek candidates
+        self.middle = [(segment, *_longest_literal(segment)) for segment in segments[1:-1] if segment]
+        self.min_length = sum(len(segment) for segment in segments)
+        # Any matching string must contain this literal, which makes a cheap pre-filter
+        self.required = max((_longest_literal(segment)[0] for segment in segments), key=len)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.pattern!r})'
+
+
+    def _find(self, string: str, segment: str, literal: str, offset: int, start: int, end: int) -> int:
+        # Leftmost i in [start, end - len(segment)] where segment matches, or -1
+        last = end - len(segment)
+        if not literal:  # Segment is all '?', so it fits anywhere there is room
+            return start if start <= last else -1
+        if len(literal) == len(segment):
+            return string.find(segment, start, end)
+        # Let str.find locate the literal part, then check the '?' parts around it
+        i = string.find(literal, start + offset, last + offset + len(literal))
+        while i != -1:
+            if _matches_at(string, segment, i - offset):
+                return i - offset
+            i = string.find(literal, i + 1, last + offset + len(literal))
+        return -1
+
+
+    def match(self, string: str) -> bool:
+        n = len(string)
+        if not self.has_star:
+            return n == len(self.prefix) and _matches_at(string, self.prefix, 0)
+        if n < self.min_length:
+            return False
+        if not _matches_at(string, self.prefix, 0):
+            return False
+        end = n - len(self.suffix)
+        if not _matches_at(string, self.suffix, end):
+            return False
+
+        pos = len(self.prefix)
+        for segment, literal, offset in self.middle:
+            i = self._find(string, segment, literal, offset, pos, end)
+            if i == -1:
+                return False
+            pos = i + len(segment)
+        return True
+
+
+@lru_cache(maxsize=4096)
+def compile(pattern: str) -> CompiledPattern:
+    """ Compile :pattern:, reusing a bounded cache of recently compiled patterns """
+    return CompiledPattern(pattern)
+
+
+def match(string: str, pattern: str) -> bool:
+    return compile(pattern).match(string)
+
+
+def match_many(strings, patterns: list):
+    """ Yield, for each string, the sorted indices of the patterns it matches
+
+    Patterns are compiled once and bucketed: wildcard-free patterns are a dict
+    lookup, star-free patterns are only tried on strings of their exact length, and
+    the rest are skipped unless the string is long enough and contains the
+    pattern's required literal
+    """
+    exact = {}
+    fixed_length = {}
+    starred = []
+    for idx, pattern in enumerate(patterns):
+        compiled = compile(pattern)
+        if '*' not in pattern and '?' not in pattern:
+            exact.setdefault(pattern, []).append(idx)
+        elif not compiled.has_star:
+            fixed_length.setdefault(len(pattern), []).append((idx, compiled))
+        else:
+            starred.append((idx, compiled))
+
+    for string in strings:
+        hits = list(exact.get(string, ()))
+        for idx, compiled in fixed_length.get(len(string), ()):
+            if compiled.match(string):
+                hits.append(idx)
+        n = len(string)
+        for idx, compiled in starred:
+            if n >= compiled.min_length and compiled.required in string and compiled.match(string):
+                hits.append(idx)
+        hits.sort()
+        yield hits
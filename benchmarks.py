@@ -0,0 +1,283 @@
+"""
+Timing benchmarks comparing naive solutions against their faster variants
+
+Run everything with `python benchmarks.py`, or a subset by name, e.g.
+`python benchmarks.py minimum_cost_of_reducing_array`
+"""
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from algorithms import dp
+from algorithms import edit_distance
+from algorithms import fuzzy_index
+from algorithms import k_sum
+from algorithms import packed_hamming
+from algorithms import pairwise
+from algorithms import recursion
+from algorithms import sliding_window
+from algorithms import two_pointers
+
+
+def _time(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def _report(label: str, n, seconds: float):
+    print(f'  {label:<40} n={n:<10} {seconds * 1000:>12.2f} ms')
+
+
+def _time_and_peak(fn, *args, **kwargs) -> tuple:
+    """ (seconds, peak bytes allocated) for one call. Tracing slows the call down,
+    so time and memory come from separate runs """
+    seconds = _time(fn, *args, **kwargs)
+    tracemalloc.start()
+    fn(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def bench_minimum_cost_of_reducing_array():
+    rng = random.Random(0)
+    for n in [6, 8]:
+        array = [rng.randint(0, 100) for _ in range(n)]
+        _report('naive recursion', n, _time(dp.minimum_cost_of_reducing_array, array))
+    for method, sizes in [
+        ('interval', [10, 100, 300]),
+        ('knuth', [10, 100, 1000]),
+        ('garsia_wachs', [10, 100, 1000, 10**4, 10**5]),
+    ]:
+        for n in sizes:
+            array = [rng.randint(0, 100) for _ in range(n)]
+            _report(method, n, _time(dp.minimum_cost_of_reducing_array_fast, array, method))
+
+
+def bench_batch_min_cost_path():
+    rng = np.random.default_rng(0)
+    costs = rng.integers(0, 100, size=(1000, 8, 8))
+    _report('MinCostPath.solve_dp, one at a time', len(costs),
+            _time(lambda: [recursion.MinCostPath(c).solve_dp() for c in costs]))
+    for batch in [10**4, 10**5, 10**6]:
+        costs = rng.integers(0, 100, size=(batch, 8, 8))
+        _report('batch_min_cost_path (8x8)', batch, _time(recursion.batch_min_cost_path, costs))
+        blocked = rng.random(costs.shape) < 0.1
+        _report('batch_min_cost_path (8x8, blocked)', batch,
+                _time(recursion.batch_min_cost_path, costs, blocked=blocked))
+
+
+def bench_family_structure():
+    rng = np.random.default_rng(0)
+    n = 60
+    ks = rng.integers(1, 2**(n - 1), size=10**4)
+    _report('recursive', len(ks), _time(
+        lambda: [recursion.family_structure_with_deterministic_children(n, int(k)) for k in ks]))
+    _report('closed form', len(ks), _time(
+        lambda: [recursion.family_structure_closed_form(n, int(k)) for k in ks]))
+    for size in [10**4, 10**6, 10**7]:
+        ks = rng.integers(1, 2**(n - 1), size=size)
+        _report('batch', size, _time(recursion.family_structure_batch, n, ks))
+
+
+def bench_subarray_sum():
+    rng = np.random.default_rng(0)
+    for n in [10**4, 10**6, 10**7]:
+        array = rng.integers(-100, 100, size=n)
+        values = array.tolist()
+        for mode in ['first', 'count', 'all']:
+            if n <= 10**6:
+                _report(f'{mode}, python', n, _time(
+                    sliding_window.subarray_sum_matches, values, 1000, mode, backend='python'))
+            _report(f'{mode}, numpy', n, _time(
+                sliding_window.subarray_sum_matches, array, 1000, mode, backend='numpy'))
+
+
+def bench_equilibrium_indices(n: int = 10**7):
+    rng = np.random.default_rng(0)
+    array = rng.integers(-100, 100, size=n, dtype=np.int32)
+    values = array[:10**6].tolist()
+    _report('equilibrium_indices', len(values), _time(sliding_window.equilibrium_indices, values))
+    _report('equilibrium_indices_vectorized', n, _time(sliding_window.equilibrium_indices_vectorized, array))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'series.bin')
+        array.tofile(path)
+        _report('equilibrium_indices_streaming (file)', n, _time(
+            lambda: list(sliding_window.equilibrium_indices_streaming(path, np.int32))))
+
+
+def bench_anagram_search(n: int = 10**7, n_patterns: int = 100):
+    rng = np.random.default_rng(0)
+    text = rng.integers(ord('a'), ord('e'), size=n, dtype=np.uint8).tobytes()
+    patterns = [rng.integers(ord('a'), ord('e'), size=8, dtype=np.uint8).tobytes() for _ in range(n_patterns)]
+    _report('substring_anagrams, per pattern', 10**6, _time(sliding_window.substring_anagrams, text[:10**6], patterns[0]))
+    _report(f'anagram_search, {n_patterns} patterns', n, _time(sliding_window.anagram_search, text, patterns))
+
+
+def bench_product_threshold(n: int = 10**5, n_queries: int = 10**4):
+    rng = np.random.default_rng(0)
+    array = rng.choice([0, 1, 2, 3, 5, 7, 10], size=n).tolist()
+    ps = [int(p) for p in rng.integers(1, 10**12, size=n_queries)]
+    looped = ps[:100]
+    _report('minimum_subarray_with_given_product, 100 p', n, _time(
+        lambda: [two_pointers.minimum_subarray_with_given_product(array, p) for p in looped]))
+    for backend in ['python', 'numpy']:
+        _report(f'ProductThresholdIndex ({backend}), {n_queries} p', n, _time(
+            lambda backend=backend: two_pointers.ProductThresholdIndex(array).query_many(ps, backend)))
+
+
+def bench_k_sum():
+    rng = np.random.default_rng(0)
+    for n in [1000, 3000, 10**4]:
+        array = rng.integers(-10**6, 10**6, size=n).tolist()
+        for backend in ['python', 'numpy']:
+            _report(f'triplets_with_sum ({backend})', n, _time(
+                lambda array=array, backend=backend: sum(1 for _ in k_sum.triplets_with_sum(array, 0, backend))))
+    array = rng.integers(-10**6, 10**6, size=10**6).tolist()
+    _report('pairs_with_sum (hash, all)', len(array), _time(lambda: sum(1 for _ in k_sum.pairs_with_sum(array, 0))))
+    _report('pairs_with_sum (sort, all)', len(array), _time(
+        lambda: sum(1 for _ in k_sum.pairs_with_sum(sorted(array), 0, presorted=True))))
+    _report('pair_indices_with_sum (first 10)', len(array), _time(
+        lambda: list(itertools.islice(k_sum.pair_indices_with_sum(array, 0), 10))))
+
+
+def bench_streaming_runs(n: int = 10**7):
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 256, size=n, dtype=np.uint8)
+    data = _random_string(random.Random(0), 10**6, 'aab')
+    stream = two_pointers.remove_consecutive_duplicates_stream
+    for backend in ['python', 'numpy']:
+        _report(f'longest_mountain_streaming ({backend})', n, _time(
+            two_pointers.longest_mountain_streaming, values, backend=backend))
+        _report(f'remove_consecutive_duplicates_stream ({backend})', len(data), _time(
+            lambda backend=backend: sum(map(len, stream(data, backend=backend)))))
+
+
+def _random_string(rng, n: int, alphabet: str = 'acgt') -> str:
+    return ''.join(rng.choice(alphabet) for _ in range(n))
+
+
+def bench_levenshtein():
+    rng = random.Random(0)
+    for fn, sizes in [
+        (edit_distance.levenshtein_wagner_fischer, [10, 100, 1000]),
+        (edit_distance.levenshtein_two_row, [10, 100, 1000, 3000]),
+        (edit_distance.levenshtein_myers, [10, 100, 1000, 10**4, 10**5]),
+    ]:
+        for n in sizes:
+            s1, s2 = _random_string(rng, n), _random_string(rng, n)
+            _report(fn.__name__, n, _time(fn, s1, s2))
+
+
+def bench_lcs():
+    rng = random.Random(0)
+    for fn, sizes in [
+        (edit_distance.lcs, [100, 1000]),
+        (edit_distance.lcs_bit_parallel, [100, 1000, 10**4, 10**5]),
+        (edit_distance.lcs_hirschberg, [100, 1000, 10**4]),
+    ]:
+        for n in sizes:
+            s1, s2 = _random_string(rng, n), _random_string(rng, n)
+            seconds, peak = _time_and_peak(fn, s1, s2)
+            _report(f'{fn.__name__} ({peak / 2**20:.1f} MiB)', n, seconds)
+    # Documents as token sequences over a large vocabulary, where matches are sparse
+    for n in [1000, 10**4, 10**5]:
+        tokens1 = [rng.randrange(10**5) for _ in range(n)]
+        tokens2 = [rng.randrange(10**5) for _ in range(n)]
+        for fn in [edit_distance.lcs_hunt_szymanski, edit_distance.lcs_bit_parallel]:
+            seconds, peak = _time_and_peak(fn, tokens1, tokens2)
+            _report(f'{fn.__name__}, tokens ({peak / 2**20:.1f} MiB)', n, seconds)
+
+
+def bench_record_linkage(n: int = 10**5):
+    rng = random.Random(0)
+    alphabet = 'abcdefghijklmnopqrstuvwxyz'
+    query = _random_string(rng, 12, alphabet)
+    candidates = [_random_string(rng, rng.randint(6, 16), alphabet) for _ in range(n)]
+    for metric, fn in [
+        ('jaro_winkler', edit_distance.jaro_winkler),
+        ('damerau_levenshtein_osa', edit_distance.damerau_levenshtein_osa),
+        ('damerau_levenshtein', edit_distance.damerau_levenshtein),
+    ]:
+        _report(f'{metric}, one call per candidate', n, _time(lambda fn=fn: [fn(query, c) for c in candidates]))
+        _report(f'score_many({metric})', n, _time(edit_distance.score_many, query, candidates, metric))
+
+
+def bench_packed_hamming(n: int = 10**6, n_queries: int = 200):
+    rng = np.random.default_rng(0)
+    fingerprints = rng.integers(0, 256, size=(10**4, 8), dtype=np.uint8)
+    as_strings = [f.tobytes() for f in fingerprints]
+    _report('edit_distance.hamming, one vs many', len(as_strings),
+            _time(lambda: [edit_distance.hamming(as_strings[0], f) for f in as_strings]))
+    for bits in [64, 256]:
+        database = packed_hamming.pack(rng.integers(0, 256, size=(n, bits // 8), dtype=np.uint8))
+        queries = database[:n_queries]
+        for label, fn, args, comparisons in [
+            ('distances (one vs many)', packed_hamming.distances, (queries[0], database), n),
+            ('distance_matrix', packed_hamming.distance_matrix, (queries, database), n * n_queries),
+            ('top_k, k=10', packed_hamming.top_k, (queries, database, 10), n * n_queries),
+        ]:
+            seconds = _time(fn, *args)
+            _report(f'{bits} bits, {label} ({comparisons / seconds / 1e6:.0f} M/s)', comparisons, seconds)
+
+
+def bench_fuzzy_index(sizes=(10**4, 10**5, 10**6), n_queries: int = 5):
+    rng = random.Random(0)
+    alphabet = 'abcdefghijklmnopqrstuvwxyz'
+    for n in sizes:
+        words = [_random_string(rng, rng.randint(4, 12), alphabet) for _ in range(n)]
+        queries = [_random_string(rng, rng.randint(4, 12), alphabet) for _ in range(n_queries)]
+
+        def brute_force(queries, words):
+            for query in queries:
+                [w for w in words if edit_distance.levenshtein_within(query, w, 2) is not None]
+
+        _report('brute force, levenshtein_within', n, _time(brute_force, queries, words) / n_queries)
+        for cls in [fuzzy_index.BKTree, fuzzy_index.TrieIndex]:
+            start = time.perf_counter()
+            index = cls.build(words)
+            _report(f'{cls.__name__}.build', n, time.perf_counter() - start)
+            visited = 0
+            start = time.perf_counter()
+            for query in queries:
+                index.search(query, 2)
+                visited += index.last_stats['visited']
+            _report(f'{cls.__name__}.search (visited {visited // n_queries})', n,
+                    (time.perf_counter() - start) / n_queries)
+
+
+def bench_pairwise(n: int = 2000, length: int = 20):
+    rng = random.Random(0)
+    alphabet = 'abcdefghijklmnopqrstuvwxyz'
+    strings = [_random_string(rng, rng.randint(length // 2, length), alphabet) for _ in range(n)]
+    subset = strings[:200]
+    _report('levenshtein_wagner_fischer loop', len(subset), _time(
+        lambda: [[edit_distance.levenshtein_wagner_fischer(s1, s2) for s2 in subset] for s1 in subset]))
+    _report('pairwise', len(subset), _time(pairwise.pairwise, subset))
+    # Scaling across core counts, on the full set
+    n_jobs = 1
+    while n_jobs <= (os.cpu_count() or 1):
+        _report(f'pairwise, n_jobs={n_jobs}', n, _time(pairwise.pairwise, strings, n_jobs=n_jobs))
+        _report(f'pairwise, threshold=3, n_jobs={n_jobs}', n,
+                _time(pairwise.pairwise, strings, threshold=3, n_jobs=n_jobs))
+        n_jobs *= 2
+    hamming_strings = [_random_string(rng, length, alphabet) for _ in range(n)]
+    _report('pairwise, hamming', n, _time(pairwise.pairwise, hamming_strings, metric='hamming'))
+
+
+BENCHMARKS = {
+    name[len('bench_'):]: fn for name, fn in list(globals().items()) if name.startswith('bench_')
+}
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        print(name)
+        BENCHMARKS[name]()
@@ -1,14 +1,32 @@
+import fnmatch
+import itertools
+import math
+import mmap
+import multiprocessing
+import sqlite3
+import subprocess
 import sys
+import time
+
+import numpy as np
 import pytest
 
-from algorithms import max_subarray
-from algorithms import sorting
+from algorithms import backend
+from algorithms import dp
 from algorithms import dutch_national_flag
-from algorithms import two_pointers
+from algorithms import edit_distance
 from algorithms import fibonacci
+from algorithms import fuzzy_index
+from algorithms import k_sum
+from algorithms import max_subarray
+from algorithms import packed_hamming
+from algorithms import pairwise
 from algorithms import recursion
 from algorithms import sliding_window
-from algorithms import dp
+from algorithms import sorting
+from algorithms import two_pointers
+from algorithms import wildcard
+from algorithms.disk_cache import DiskCache, make_key
 
 
 @pytest.mark.parametrize('array,max_sum', [
@@ -75,6 +93,55 @@ def test_minimum_subarray_with_given_product(array, p, expect):
 def test_minimum_subarray_with_given_product_raises():
     with pytest.raises(ValueError):
         two_pointers.minimum_subarray_with_given_product([1, 2, 3, 4, 5, 6], 1000)
+    # Only non-negative integers: a factor below 1 shrinks a growing window's product
+    with pytest.raises(TypeError):
+        two_pointers.minimum_subarray_with_given_product([2, 0.5, 3], 3)
+    with pytest.raises(TypeError):
+        two_pointers.ProductThresholdIndex([1.5, 2])
+    with pytest.raises(ValueError):
+        two_pointers.minimum_subarray_with_given_product([2, -1, 3], 3)
+    assert two_pointers.minimum_subarray_with_given_product(np.array([1, 4, 2, 5]), 10) == 2
+    assert two_pointers.minimum_subarray_with_given_product(np.array([10**9] * 4), 10**36) == 4
+
+
+@pytest.mark.parametrize('array, p, expect', [
+    ([10, 1, 1], 10, 1),  # Used to raise once the remaining suffix fell below p
+    ([3, 0, 2, 5, 0, 4], 10, 2),
+    ([0, 0], 0, 1),
+    ([10**9] * 50, 10**450, 50),
+])
+def test_minimum_subarray_with_given_product_exact(array, p, expect):
+    assert two_pointers.minimum_subarray_with_given_product(array, p) == expect
+
+
+def _minimum_product_subarray_brute_force(array, p):
+    lengths = [j - i for i in range(len(array)) for j in range(i + 1, len(array) + 1)
+               if math.prod(array[i:j]) >= p]
+    return min(lengths) if lengths else None
+
+
+@pytest.mark.parametrize('backend_name', ['python', 'numpy'])
+def test_product_threshold_index(backend_name):
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        array = rng.choice([0, 1, 2, 3, 5, 10], size=rng.integers(0, 12)).tolist()
+        index = two_pointers.ProductThresholdIndex(array)
+        for high in [50, 10**4]:  # The second batch extends the table further
+            ps = rng.integers(-2, high, size=5).tolist()
+            expect = [_minimum_product_subarray_brute_force(array, p) for p in ps]
+            assert index.query_many(ps, backend_name) == expect
+    with pytest.raises(ValueError):
+        two_pointers.ProductThresholdIndex([1, 2]).query(3, backend_name)
+
+
+@pytest.mark.parametrize('backend_name', ['python', 'numpy'])
+def test_product_threshold_index_equal_values(backend_name):
+    # Every window of a length ties, and large p lie far beyond the table a batch builds
+    assert two_pointers.ProductThresholdIndex([1] * 1000).query_many([2, 1], backend_name) == [None, 1]
+    index = two_pointers.ProductThresholdIndex([2] * 2000)
+    assert index.query_many([2**2000, 2**2000 + 1, 2**10], backend_name) == [2000, None, 10]
+    assert index.query_many([2**k for k in range(1, 40)], backend_name) == list(range(1, 40))
+    assert two_pointers.ProductThresholdIndex([10**9] * 50).query(10**450, backend_name) == 50
 
 
 @pytest.mark.parametrize('array, s, expect', [
@@ -86,6 +153,110 @@ def test_exact_pairwise_sum(array, s, expect):
     assert two_pointers.find_exact_pairwise_sum(array, s) == expect
 
 
+def test_zero_sum_triplets():
+    assert two_pointers.zero_sum_triplets([-1, 0, 1, 2, -1, -4]) == [(-1, -1, 2), (-1, 0, 1)]
+    assert two_pointers.zero_sum_triplets([0, 0, 0, 0]) == [(0, 0, 0)]
+    assert two_pointers.zero_sum_triplets([1, 2]) == []
+
+
+def _longest_mountain_brute(array):
+    best = 0
+    for i in range(len(array)):
+        for j in range(i + 3, len(array) + 1):
+            steps = [(y > x) - (y < x) for x, y in zip(array[i:j], array[i+1:j])]
+            peak = steps.index(-1) if -1 in steps else 0
+            if peak and steps == [1] * peak + [-1] * (len(steps) - peak):
+                best = max(best, j - i)
+    return best
+
+
+@pytest.mark.parametrize('array, expect', [
+    ([2, 1, 4, 7, 3, 2, 5], 5),
+    ([2, 2, 2], 0),
+    ([1, 2, 3], 0),
+    ([], 0),
+    ([0, 1, 0, 1, 0], 3),
+])
+@pytest.mark.parametrize('backend_name', ['python', 'numpy'])
+def test_longest_mountain_subarray(array, expect, backend_name):
+    assert two_pointers.longest_mountain_subarray(array, backend_name) == expect
+    assert two_pointers.longest_mountain_subarray(iter(array), backend_name) == expect
+
+
+@pytest.mark.parametrize('backend_name', ['python', 'numpy'])
+def test_longest_mountain_streaming(backend_name, tmp_path):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        array = rng.integers(0, 4, size=rng.integers(0, 16)).astype(np.uint8)
+        expect = _longest_mountain_brute(array.tolist())
+        chunk_size = int(rng.integers(1, 5))
+        # Mountains spanning chunk boundaries are carried over
+        assert two_pointers.longest_mountain_streaming(array, chunk_size=chunk_size, backend=backend_name) == expect
+        assert two_pointers.longest_mountain_streaming(array.tobytes(), chunk_size=chunk_size,
+                                                       backend=backend_name) == expect
+        chunks = (array[i:i + chunk_size].tolist() for i in range(0, len(array), chunk_size))
+        assert two_pointers.longest_mountain_streaming(chunks, backend=backend_name) == expect
+    path = tmp_path / 'values.bin'
+    np.array([5, 1, 3, 5, 4, 2, 2, -3, 9, 1], dtype=np.int32).tofile(path)
+    assert two_pointers.longest_mountain_streaming(path, np.int32, chunk_size=3, backend=backend_name) == 5
+
+
+def test_remove_consecutive_duplicates_string():
+    assert two_pointers.remove_consecutive_duplicates_string('aaabccddda') == 'abcda'
+    assert two_pointers.remove_consecutive_duplicates_string('') == ''
+    assert two_pointers.remove_consecutive_duplicates_string(iter('xxy')) == 'xy'
+
+
+@pytest.mark.parametrize('backend_name', ['python', 'numpy'])
+def test_remove_consecutive_duplicates_stream(backend_name, tmp_path):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        string = ''.join(rng.choice(list('abé'), size=rng.integers(0, 16)))
+        expect = two_pointers.remove_consecutive_duplicates_string(string)
+        chunk_size = int(rng.integers(1, 5))
+        stream = two_pointers.remove_consecutive_duplicates_stream(string, chunk_size, backend_name)
+        assert ''.join(stream) == expect
+        data = string.encode('latin-1')
+        chunks = [memoryview(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size)]
+        stream = two_pointers.remove_consecutive_duplicates_stream(chunks, backend=backend_name)
+        assert b''.join(stream) == expect.encode('latin-1')
+
+    # Written through from a memory-mapped file
+    source, target = tmp_path / 'in.txt', tmp_path / 'out.txt'
+    source.write_bytes(b'aaaabbbbccccaaaa' * 3)
+    with open(source, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+            open(target, 'wb') as out:
+        out.writelines(two_pointers.remove_consecutive_duplicates_stream(mapped, 4, backend_name))
+    assert target.read_bytes() == b'abcabcabca'
+
+
+@pytest.mark.parametrize('backend_name', ['python', 'numpy'])
+def test_triplets_with_sum(backend_name):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        array = rng.integers(-5, 6, size=rng.integers(0, 12)).tolist()
+        s = int(rng.integers(-4, 5))
+        expect = sorted({tuple(sorted(t)) for t in itertools.combinations(array, 3) if sum(t) == s})
+        assert list(k_sum.triplets_with_sum(array, s, backend_name)) == expect
+
+
+def test_pairs_with_sum():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        array = rng.integers(-5, 6, size=rng.integers(0, 12)).tolist()
+        s = int(rng.integers(-4, 5))
+        expect = sorted({tuple(sorted(t)) for t in itertools.combinations(array, 2) if sum(t) == s})
+        assert sorted(k_sum.pairs_with_sum(array, s)) == expect
+        assert list(k_sum.pairs_with_sum(sorted(array), s, presorted=True)) == expect
+        indices = [(i, j) for i, j in itertools.combinations(range(len(array)), 2) if array[i] + array[j] == s]
+        assert list(k_sum.pair_indices_with_sum(iter(array), s)) == sorted(indices, key=lambda ij: (ij[1], ij[0]))
+
+
+def test_pair_indices_with_sum_is_lazy():
+    # The first pair is found without reading the rest of an unbounded stream
+    assert next(k_sum.pair_indices_with_sum(itertools.count(), 7)) == (3, 4)
+
+
 @pytest.mark.parametrize('fn', [
     fibonacci.fibonacci_recursion,
     fibonacci.fibonacci_memoized,
@@ -132,13 +303,74 @@ def test_subarray_sum_equals(array, s, expect):
     assert sliding_window.subarray_sum_equals(array, s) == expect
 
 
+def _subarray_sums_brute_force(array, s):
+    return [(i, j) for j in range(1, len(array) + 1) for i in range(j) if sum(array[i:j]) == s]
+
+
+@pytest.mark.parametrize('backend_name', ['python', 'numpy'])
+def test_subarray_sum_matches(backend_name):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        array = rng.integers(-4, 5, size=rng.integers(0, 15)).tolist()
+        s = int(rng.integers(-5, 6))
+        expect = _subarray_sums_brute_force(array, s)
+        assert sliding_window.subarray_sum_matches(array, s, 'all', backend_name) == expect
+        assert sliding_window.subarray_sum_matches(array, s, 'count', backend_name) == len(expect)
+        assert sliding_window.subarray_sum_matches(array, s, 'first', backend_name) == (
+            expect[0] if expect else None)
+        assert sliding_window.subarray_sum_matches(array, s, 'shortest', backend_name) == (
+            min(expect, key=lambda match: (match[1] - match[0], match[1])) if expect else None)
+
+
+def test_subarray_sum_negatives():
+    # Shrinking a window while its sum exceeds s misses this one
+    assert sliding_window.subarray_sum_equals([5, -3, 4], 6) == [5, -3, 4]
+    # Sums past int64 fall back to exact Python ints
+    big = [2**62, 2**62, -2**62]
+    assert sliding_window.subarray_sum_matches(big, 2**63, 'all', backend='numpy') == [(0, 2)]
+
+
+@pytest.mark.parametrize('s', [2**63, -2**63, 2**62, 2**63 - 1, 2**70])
+@pytest.mark.parametrize('backend_name', ['python', 'numpy'])
+def test_subarray_sum_large_target(s, backend_name):
+    # Small sums, but s itself does not fit the int64 arithmetic
+    assert sliding_window.subarray_sum_matches([1, 2, 3], s, 'count', backend_name) == 0
+    assert sliding_window.subarray_sum_matches([1, 2, 3], s, 'all', backend_name) == []
+    array = [2**61, 2**61, -1, 2**61]
+    expect = _subarray_sums_brute_force(array, s)
+    assert sliding_window.subarray_sum_matches(array, s, 'all', backend_name) == expect
+
+
+@pytest.mark.parametrize('mode', ['first', 'shortest', 'count', 'all'])
+def test_prefix_sum_matcher_chunks(mode):
+    rng = np.random.default_rng(0)
+    array = rng.integers(-3, 4, size=100)
+    matcher = sliding_window.PrefixSumMatcher(2, mode)
+    matches = []
+    for i in range(0, len(array), 7):
+        matches += matcher.update(array[i:i+7])
+    expect = sliding_window.subarray_sum_matches(array.tolist(), 2, mode, backend='python')
+    assert (matches if mode == 'all' else matcher.result) == expect
+    # The running state covers every chunk fed, including those after a match
+    assert matcher.n == len(array)
+    assert matcher.total == int(array.sum())
+
+
+def test_prefix_sum_matcher_first_keeps_counting():
+    matcher = sliding_window.PrefixSumMatcher(3, 'first')
+    matcher.update([1, 2, 5, 7])  # Matches (0, 2), mid-chunk
+    matcher.update([3])
+    assert matcher.result == (0, 2)
+    assert (matcher.n, matcher.total) == (5, 18)
+
+
 @pytest.mark.parametrize('array,k,expect', [
     ([1, 2, 2, 1, 2, 1], 3, -1),
     ([1, 2, 2, 1, 2, 1], 2, 2),
     ([1, 1, 1, 2, 2, 3, 3, 2], 3, 4),
     ([1, 1, 1, 2, 2, 3, 3, 2, 1], 3, 3),
 ])
-def test_subarray_sum_equals(array, k, expect):
+def test_smallest_subarray_with_k_distinct(array, k, expect):
     assert sliding_window.smallest_subarray_with_k_distinct(array, k) == expect
 
 
@@ -146,9 +378,114 @@ def test_subarray_sum_equals(array, k, expect):
     ([-7, 1, 5, 2, -4, 3, 0], [3, 6]),
     ([-2, 1, 9, 2, -6, 3, 0], [2]),
     ([1, 2, 3, 4, 5], []),
+    ([], []),
+    ([0], [0]),
 ])
 def test_equilibrium_indices(array, expect):
     assert sliding_window.equilibrium_indices(array) == expect
+    assert sliding_window.equilibrium_indices_vectorized(np.array(array, dtype=np.int64)).tolist() == expect
+    streamed = sliding_window.equilibrium_indices_streaming(np.array(array, dtype=np.int64), chunk_size=2)
+    assert [i for indices in streamed for i in indices.tolist()] == expect
+
+
+def test_equilibrium_indices_streaming_file(tmp_path):
+    rng = np.random.default_rng(0)
+    array = rng.integers(-3, 4, size=1000).astype(np.int16)
+    array.tofile(tmp_path / 'series.bin')
+    expect = sliding_window.equilibrium_indices(array.tolist())
+    assert expect  # Make sure there is something to find
+    streamed = sliding_window.equilibrium_indices_streaming(tmp_path / 'series.bin', np.int16, chunk_size=64)
+    assert np.concatenate(list(streamed)).tolist() == expect
+
+
+def test_equilibrium_indices_overflow():
+    # Prefix sums reach 4 * 2**62, past int64
+    array = np.array([2**62] * 4 + [0] + [2**62] * 4, dtype=np.int64)
+    assert sliding_window.equilibrium_indices_vectorized(array).tolist() == [4]
+    streamed = sliding_window.equilibrium_indices_streaming(array, chunk_size=3)
+    assert np.concatenate(list(streamed)).tolist() == [4]
+
+
+@pytest.mark.parametrize('array,k,expect', [
+    ([1, 2, 1, 3, 4, 2, 3], 4, [3, 4, 4, 3]),
+    ([1, 1, 1], 2, [1, 1]),
+    ([1, 2], 3, []),
+])
+def test_count_distinct_element_in_k_size_window(array, k, expect):
+    assert sliding_window.count_distinct_element_in_k_size_window(array, k) == expect
+
+
+@pytest.mark.parametrize('aggregate,fn', [
+    ('sum', sum), ('min', min), ('max', max), ('distinct', lambda window: len(set(window))),
+])
+def test_window_aggregator_fixed(aggregate, fn):
+    rng = np.random.default_rng(0)
+    array = rng.integers(0, 10, size=200).tolist()
+    for k in [1, 3, 7]:
+        expect = [fn(array[i:i+k]) for i in range(len(array) - k + 1)]
+        assert list(sliding_window.WindowAggregator(aggregate, size=k).feed(iter(array))) == expect
+        chunks = [np.array(array[i:i+13]) for i in range(0, len(array), 13)]
+        assert list(sliding_window.WindowAggregator(aggregate, size=k).feed_chunks(chunks)) == expect
+
+
+def test_window_aggregator_variable():
+    # Longest window ending at each element whose sum stays <= 10
+    window = sliding_window.WindowAggregator('sum', shrink_while=lambda w: w.value > 10)
+    array = [3, 4, 5, 1, 9, 2]
+    sums, starts = [], []
+    for x in array:
+        window.push(x)
+        sums.append(window.value)
+        starts.append(window.start)
+    assert sums == [3, 7, 9, 10, 10, 2]
+    assert starts == [0, 0, 1, 1, 3, 5]
+    # Longest window ending at each element with at most 2 distinct values
+    window = sliding_window.WindowAggregator('distinct', shrink_while=lambda w: w.value > 2)
+    assert list(window.feed('aabcbbca')) == [1, 1, 2, 2, 2, 2, 2, 2]
+    with pytest.raises(ValueError):
+        sliding_window.WindowAggregator('sum')
+
+
+def _anagrams_brute_force(string, pattern):
+    m = len(pattern)
+    return [i for i in range(len(string) - m + 1) if sorted(string[i:i+m]) == sorted(pattern)]
+
+
+@pytest.mark.parametrize('string,substring,expect', [
+    ('subbusbam', 'sub', [0, 3, 4]),
+    ('abab', 'ab', [0, 1, 2]),
+    ('ab', 'abc', []),
+    (b'aabaa', b'aa', [0, 3]),
+])
+def test_substring_anagrams(string, substring, expect):
+    assert sliding_window.substring_anagrams(string, substring) == expect
+
+
+def test_anagram_search():
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        text = ''.join(rng.choice(list('abc'), size=rng.integers(0, 30)))
+        m = int(rng.integers(1, 4))
+        patterns = sorted({''.join(rng.choice(list('abc'), size=m)) for _ in range(4)})
+        for chunk_size in [1, 3, 100]:
+            found = sliding_window.anagram_search(text, patterns, chunk_size=chunk_size)
+            found_bytes = sliding_window.anagram_search(
+                text.encode(), [p.encode() for p in patterns], chunk_size=chunk_size)
+            for pattern in patterns:
+                expect = _anagrams_brute_force(text, pattern)
+                assert sliding_window.substring_anagrams(text, pattern) == expect
+                assert found[pattern].tolist() == expect
+                assert found_bytes[pattern.encode()].tolist() == expect
+    with pytest.raises(ValueError):
+        sliding_window.anagram_search('abc', ['a', 'ab'])
+
+
+def test_anagram_search_mmap(tmp_path):
+    (tmp_path / 'log').write_bytes(b'xxabcyycabzz')
+    with open(tmp_path / 'log', 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as text:
+        found = sliding_window.anagram_search(text, [b'abc', b'bca', b'zzb'])
+    assert found[b'abc'].tolist() == found[b'bca'].tolist() == [2, 7]
+    assert found[b'zzb'].tolist() == [9]
 
 
 @pytest.mark.parametrize('array,expect', [
@@ -180,4 +517,609 @@ def test_minimum_cost_of_reducing_array(array, expect):
     ('abcde', '???', False),
 ])
 def test_me(string, pat, expect):
-    assert dp.wildcard_matching(string, pat) == expect
\ No newline at end of file
+    assert dp.wildcard_matching(string, pat) == expect
+
+
+def test_disk_cache_memoize(tmp_path):
+    cache = DiskCache(tmp_path / 'cache.sqlite')
+    calls = []
+
+    @cache.memoize(version=1)
+    def distance(s1, s2):
+        calls.append((s1, s2))
+        return edit_distance.levenshtein_wagner_fischer(s1, s2)
+
+    assert distance('kitten', 'sitting') == 3
+    assert distance('kitten', 'sitting') == 3
+    assert len(calls) == 1
+    # A fresh handle on the same file sees the stored result
+    assert DiskCache(tmp_path / 'cache.sqlite').get(
+        make_key(distance.__module__ + '.' + distance.__qualname__, 1, ('kitten', 'sitting'))) == 3
+
+
+def test_disk_cache_key_is_stable():
+    costs = np.arange(12).reshape(3, 4)
+    assert make_key('f', 1, (costs,)) == make_key('f', 1, (costs.copy(),))
+    assert make_key('f', 1, (costs,)) != make_key('f', 2, (costs,))
+    assert make_key('f', 1, (costs,)) != make_key('f', 1, (costs.astype(np.int8),))
+    assert make_key('f', 1, (costs,)) != make_key('f', 1, (costs.reshape(4, 3),))
+    assert make_key('f', 1, (), {'a': 1, 'b': 2}) == make_key('f', 1, (), {'b': 2, 'a': 1})
+    with pytest.raises(TypeError):
+        make_key('f', 1, (object(),))
+    # Object arrays are keyed on their elements, not on the pointers they hold
+    words = np.array(['ab', 'c', 10**30], dtype=object)
+    equal_words = np.array([''.join(['a', 'b']), 'c', int('1' + '0' * 30)], dtype=object)
+    assert make_key('f', 1, (words,)) == make_key('f', 1, (equal_words,))
+    assert make_key('f', 1, (words,)) != make_key('f', 1, (np.array(['ab', 'c', 1], dtype=object),))
+    with pytest.raises(TypeError):
+        make_key('f', 1, (np.array([object()], dtype=object),))
+
+
+def test_disk_cache_eviction(tmp_path):
+    cache = DiskCache(tmp_path / 'cache.sqlite', max_bytes=4000)
+    for i in range(20):
+        cache.set(str(i), np.random.default_rng(i).bytes(1025))  # Incompressible
+    assert cache.total_bytes() <= 4000
+    assert '19' in cache
+    assert '0' not in cache
+
+
+def test_disk_cache_reads_do_not_write(tmp_path):
+    path = tmp_path / 'cache.sqlite'
+    cache = DiskCache(path, max_bytes=2500, access_granularity=0)
+    cache.set('a', np.random.default_rng(0).bytes(1025))
+    cache.set('b', np.random.default_rng(1).bytes(1025))
+    with sqlite3.connect(path) as conn:
+        before = conn.execute("SELECT accessed FROM entries WHERE key = 'a'").fetchone()
+    time.sleep(0.01)
+    assert cache.get('a') is not None
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT accessed FROM entries WHERE key = 'a'").fetchone() == before
+    # The queued access is written by the next set, before it evicts: 'b' is now LRU
+    cache.set('c', np.random.default_rng(2).bytes(1025))
+    assert 'a' in cache and 'c' in cache
+    assert 'b' not in cache
+
+
+def _cached_lcs(args):
+    path, s1, s2 = args
+    return DiskCache(path).memoize(version=1, name='lcs')(edit_distance.lcs)(s1, s2)
+
+
+def test_disk_cache_multiprocessing(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    jobs = [(path, 'abcbdab', 'bdcaba'), (path, 'kitten', 'sitting')] * 8
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        results = pool.map(_cached_lcs, jobs)
+    assert results == [4, 4] * 8
+    assert len(DiskCache(path)) == 2
+
+
+@pytest.mark.parametrize('array,k,m,expect_sum', [
+    ([1, 2, 1, 2, 6, 7, 5, 1], 2, 2, 20),
+    ([4, 5, 10, 40, 50, 35, 1], 2, 2, 135),
+    ([4, 5, 10, 40, 50, 35, 1], 2, 3, 144),
+    ([-1, -2, -3, -4], 1, 2, -3),
+    ([1, 2, 3], 2, 2, None),
+])
+@pytest.mark.parametrize('solution_method', ['windows', 'vectorized'])
+def test_max_sum_non_overlapping_windows(array, k, m, expect_sum, solution_method):
+    solver = dp.MaximumSumNonOverlappingArray(array, k)
+    max_sum, offsets = getattr(solver, solution_method)(m)
+    assert max_sum == expect_sum
+    assert sum(sum(array[i:i+k]) for i in offsets) == (expect_sum or 0)
+    assert all(offsets[t+1] - offsets[t] >= k for t in range(len(offsets) - 1))
+
+
+def test_max_sum_non_overlapping_prefix_sum():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        array = rng.integers(1, 100, size=rng.integers(4, 30)).tolist()
+        solver = dp.MaximumSumNonOverlappingArray(array, k=2)
+        assert solver.prefix_sum() == solver.optimized()
+
+
+def _apply_merge_order(array, order):
+    array = list(array)
+    cost = 0
+    for i in order:
+        merged = array[i] + array[i+1]
+        array[i:i+2] = [merged]
+        cost += merged
+    assert len(array) == 1
+    return cost
+
+
+@pytest.mark.parametrize('method', ['interval', 'knuth', 'garsia_wachs'])
+def test_minimum_cost_of_reducing_array_fast(method):
+    assert dp.minimum_cost_of_reducing_array_fast([10, 2, 1, 8, 1, 3], method) == 57
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        array = rng.integers(0, 50, size=rng.integers(2, 7)).tolist()
+        cost, order = dp.minimum_cost_of_reducing_array_fast(array, method, return_merge_order=True)
+        assert cost == dp.minimum_cost_of_reducing_array(array)
+        assert _apply_merge_order(array, order) == cost
+
+
+def test_minimum_cost_of_reducing_array_fast_agree():
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        array = rng.integers(0, 1000, size=60).tolist()
+        assert (dp.minimum_cost_of_reducing_array_fast(array, 'knuth')
+                == dp.minimum_cost_of_reducing_array_fast(array, 'garsia_wachs'))
+
+
+@pytest.mark.parametrize('string,pat,expect', [
+    ('abcde', 'ab?de', True),
+    ('abcde', 'abc', False),
+    ('abcde', '*', True),
+    ('abcde', 'ab*e', True),
+    ('abcde', '*f', False),
+    ('abcde', '????e', True),
+    ('abcde', '???', False),
+    ('abcde', '**a**e**', True),
+    ('abcabd', '*ab?', True),
+    ('abcabd', 'a*b?c*', False),
+    ('', '*', True),
+    ('', '?', False),
+])
+def test_wildcard_compiled(string, pat, expect):
+    assert wildcard.match(string, pat) == expect
+    assert dp.wildcard_matching(string, pat) == expect
+
+
+def test_wildcard_compile_collapses_stars():
+    compiled = wildcard.compile('a**b***?c*')
+    assert compiled.prefix == 'a' and compiled.suffix == ''
+    assert [segment for segment, *_ in compiled.middle] == ['b', '?c']
+    assert wildcard.compile('a**b***?c*') is compiled
+
+
+def test_wildcard_match_many():
+    rng = np.random.default_rng(0)
+    strings = [''.join(rng.choice(list('abc'), size=rng.integers(0, 8))) for _ in range(200)]
+    patterns = [''.join(rng.choice(list('abc?*'), size=rng.integers(0, 6))) for _ in range(50)]
+    for string, hits in zip(strings, wildcard.match_many(strings, patterns)):
+        assert hits == [i for i, pat in enumerate(patterns) if fnmatch.fnmatchcase(string, pat)]
+
+
+@pytest.mark.parametrize('array,k,expect', [
+    ([1, 5, 6, 2, 8], 2, 3),
+    ([1, 2, 3, 4, 5], 10, 0),
+    ([1, 3, 4, 9, 10, 11, 12, 17, 20], 4, 5),
+    ([7], 0, 0),
+    ([], 3, 0),
+])
+def test_minimum_removals_to_diff_condition(array, k, expect):
+    assert dp.minimum_removals_to_diff_condition(array, k) == expect
+
+
+def test_diff_condition_index_query_many():
+    rng = np.random.default_rng(0)
+    array = rng.integers(-100, 100, size=300).tolist()
+    index = dp.DiffConditionIndex(array)
+    ks = [0, 150, 3, 45, 200, 7]
+    expect = [len(array) - max(index.longest_windows(k)) for k in ks]
+    assert index.query_many(ks) == expect
+    assert [index.query(k) for k in ks] == expect
+
+
+@pytest.mark.parametrize('backend_name', ['python', 'numpy'])
+def test_diff_condition_index_large_k(backend_name):
+    # A k far past the spread table is answered by a direct pass, not by building
+    # the table up to it, and later batches still agree with single queries
+    array = list(range(0, 4 * 10**4, 2))
+    index = dp.DiffConditionIndex(array)
+    assert index.query_many([10**4], backend_name) == [len(array) - 5001]
+    assert len(index._min_spread) < 100
+    ks = [0, 1, 2, 10, 10**4, 10**6]
+    assert index.query_many(ks, backend_name) == [index.query(k, backend_name) for k in ks]
+
+
+@pytest.mark.parametrize('backend_name', ['python', 'numpy'])
+def test_diff_condition_index_many_k_beyond_table(backend_name):
+    # Most of these k lie past the table a batch may build, and are answered directly
+    rng = np.random.default_rng(0)
+    array = rng.integers(0, 10**6, size=3000).tolist()
+    index = dp.DiffConditionIndex(array)
+    ks = rng.integers(0, 10**6, size=50).tolist() + [5, 5, 10**7]
+    expect = [len(array) - max(index.longest_windows(k)) for k in ks]
+    assert index.query_many(ks, backend_name) == expect
+    assert len(index._min_spread) < len(array)
+
+
+@pytest.mark.parametrize('n', [1, 2, 3, 4, 7, 10])
+def test_tower_of_hanoi_streaming(n):
+    moves = recursion.tower_of_hanoi(n)
+    assert list(recursion.iter_tower_of_hanoi(n)) == moves
+    assert list(recursion.iter_tower_of_hanoi(n, start=n)) == moves[n:]
+    assert [recursion.move_at(i, n) for i in range(len(moves))] == moves
+
+    codes = {'source': 0, 'aux': 1, 'dest': 2}
+    chunks = list(recursion.iter_tower_of_hanoi_chunks(n, chunk_size=5))
+    assert all(len(chunk) <= 5 for chunk in chunks)
+    assert np.concatenate(chunks).tolist() == [[ring, codes[a], codes[b]] for ring, a, b in moves]
+
+
+def test_tower_of_hanoi_move_at_large_n():
+    # The middle move always carries the largest ring straight to dest
+    assert recursion.move_at(2**59 - 1, 60) == (60, 'source', 'dest')
+    with pytest.raises(IndexError):
+        recursion.move_at(2**3 - 1, 3)
+
+
+def test_hanoi_simulator_reports_first_illegal_move():
+    moves = np.array([[1, 0, 2], [2, 0, 1], [1, 2, 1], [3, 0, 2], [2, 1, 2]])
+    simulator = recursion.HanoiSimulator(3)
+    assert simulator.run(moves) == 4  # Ring 2 is under ring 1
+    assert simulator.to_state() == {'source': [], 'aux': [2, 1], 'dest': [3]}
+
+    assert recursion.HanoiSimulator(3).run([(1, 0, 2), (2, 0, 2)]) == 1  # Onto smaller ring
+    assert recursion.HanoiSimulator(3).run(np.array([[1, 0, 2], [4, 0, 2]])) == 1  # No ring 4
+    assert recursion.HanoiSimulator(3).run([(1, 0, 0)]) == 0
+
+
+def test_hanoi_simulator_chunks():
+    simulator = recursion.HanoiSimulator(12)
+    for moves in recursion.iter_tower_of_hanoi_chunks(12, chunk_size=1000):
+        assert simulator.run(moves) == -1
+    assert simulator.is_solved()
+
+
+def test_tower_of_hanoi_evaluate_simulated():
+    assert recursion.TowerOfHanoi(20).evaluate(verbose=False)
+
+
+@pytest.mark.parametrize('allow_diagonal_move', [True, False])
+def test_min_cost_path_dp_path(allow_diagonal_move):
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        costs = rng.integers(0, 10, size=rng.integers(1, 8, size=2))
+        solver = recursion.MinCostPath(costs, allow_diagonal_move)
+        cost, path = solver.solve_dp(return_path=True)
+        assert cost == solver.solve_memoize()
+        assert path[0] == (0, 0) and path[-1] == (costs.shape[0] - 1, costs.shape[1] - 1)
+        assert sum(costs[cell] for cell in path) == cost
+
+
+@pytest.mark.parametrize('allow_diagonal_move', [True, False])
+def test_min_cost_path_dp_path_float(allow_diagonal_move):
+    # Rounding in the row recurrence must not pick a move the cost did not come from
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        costs = rng.random(rng.integers(1, 12, size=2))
+        solver = recursion.MinCostPath(costs, allow_diagonal_move)
+        cost, path = solver.solve_dp(return_path=True)
+        assert cost == pytest.approx(solver.solve_memoize())
+        assert path[0] == (0, 0) and path[-1] == (costs.shape[0] - 1, costs.shape[1] - 1)
+        steps = {(1, 0), (0, 1), (1, 1)} if allow_diagonal_move else {(1, 0), (0, 1)}
+        assert all((i1 - i0, j1 - j0) in steps for (i0, j0), (i1, j1) in zip(path, path[1:]))
+        assert sum(costs[cell] for cell in path) == pytest.approx(cost)
+    # Large and infinite cells used to cancel out the others (or give inf - inf = nan)
+    for big, expect in [(1e16, 0.7), (1e18, 0.7), (np.inf, 0.7)]:
+        costs = np.full((4, 4), 0.1)
+        costs[2, 0] = big
+        solver = recursion.MinCostPath(costs, allow_diagonal_move)
+        if allow_diagonal_move:
+            expect = solver.solve_memoize()
+        cost, path = solver.solve_dp(return_path=True)
+        assert cost == pytest.approx(expect)
+        assert sum(costs[cell] for cell in path) == pytest.approx(expect)
+    costs = np.array([[1, 1, 1], [np.inf, 1, np.inf], [1, np.inf, 1]])
+    solver = recursion.MinCostPath(costs, allow_diagonal_move)
+    assert solver.solve_dp() == solver.solve_memoize() == (3.0 if allow_diagonal_move else np.inf)
+
+
+def test_min_cost_path_from_file(tmp_path):
+    costs = np.random.default_rng(0).random((50, 70))
+    costs.tofile(tmp_path / 'costs.bin')
+    solver = recursion.MinCostPath.from_file(tmp_path / 'costs.bin', shape=(50, 70))
+    assert solver.solve_dp() == pytest.approx(recursion.MinCostPath(costs).solve_memoize())
+
+
+@pytest.mark.parametrize('allow_diagonal_move', [True, False])
+def test_batch_min_cost_path(allow_diagonal_move):
+    rng = np.random.default_rng(0)
+    costs = rng.integers(0, 10, size=(100, 4, 6))
+    expect = [recursion.MinCostPath(c, allow_diagonal_move).solve_memoize() for c in costs]
+    assert recursion.batch_min_cost_path(costs, allow_diagonal_move, chunk_size=32).tolist() == expect
+
+
+def test_batch_min_cost_path_blocked():
+    costs = np.array([[[3, 4, 1, 2], [2, 1, 8, 9], [4, 7, 8, 1]]] * 3)
+    blocked = np.zeros_like(costs, dtype=bool)
+    blocked[1, 1, 1] = True  # Forces a detour
+    blocked[2, :, 2] = True  # Walls off the target
+    result = recursion.batch_min_cost_path(costs, blocked=blocked)
+    assert result.tolist() == [13, 16, np.inf]
+
+
+@pytest.mark.parametrize('n,k,expect', [
+    (1, 1, 'M'),
+    (2, 1, 'M'),
+    (2, 2, 'F'),
+    (3, 3, 'F'),
+    (4, 3, 'F'),
+    (4, 6, 'M'),
+    (5000, 2**100 + 1, 'F'),  # Far past the recursion limit
+])
+def test_family_structure_closed_form(n, k, expect):
+    assert recursion.family_structure_closed_form(n, k) == expect
+
+
+def test_family_structure_batch():
+    ks = np.arange(1, 2**9 + 1)
+    expect = [recursion.family_structure_with_deterministic_children(10, k) for k in ks.tolist()]
+    assert recursion.family_structure_batch(10, ks).tolist() == expect
+    assert recursion.family_structure_batch([80, 80], [2**70, 2**70 + 1]).tolist() == ['M', 'F']
+    with pytest.raises(ValueError):
+        recursion.family_structure_batch(3, [5])
+
+
+def test_modules_import_without_numpy():
+    code = ('import sys; from algorithms import dp, recursion, edit_distance, sorting; '
+            'print("numpy" in sys.modules)')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
+    assert result.stderr == ''
+
+
+def test_backend_fallback(monkeypatch):
+    monkeypatch.setattr(backend, '_numpy', None)
+    monkeypatch.setattr(backend, '_resolved', True)
+    assert backend.resolve() == backend.PYTHON
+    with pytest.raises(ImportError):
+        backend.resolve('numpy')
+    assert edit_distance.levenshtein_wagner_fischer('kitten', 'sitting') == 3
+    assert dp.DiffConditionIndex([1, 5, 6, 2, 8]).query_many([2, 10]) == [3, 0]
+
+
+@pytest.mark.parametrize('s1,s2', [('kitten', 'sitting'), ('', 'abc'), ('flaw', 'lawn')])
+@pytest.mark.parametrize('backend_name', ['python', 'numpy'])
+def test_edit_distance_backends(s1, s2, backend_name):
+    assert (edit_distance.levenshtein_wagner_fischer(s1, s2, backend=backend_name)
+            == edit_distance.levenshtein_naive(s1, s2))
+    assert edit_distance.lcs(s1, s2, backend=backend_name) == edit_distance.lcs(s1, s2)
+    with pytest.raises(ValueError):
+        edit_distance.lcs(s1, s2, backend='fortran')
+
+
+def test_family_structure_batch_python_backend():
+    ks = list(range(1, 17))
+    assert (recursion.family_structure_batch([5] * 16, ks, backend='python')
+            == recursion.family_structure_batch(5, ks).tolist())
+
+
+@pytest.mark.parametrize('fn', [
+    edit_distance.levenshtein_myers,
+    edit_distance.levenshtein_two_row,
+])
+def test_levenshtein_fast(fn):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        s1 = ''.join(rng.choice(list('abc'), size=rng.integers(0, 12)))
+        s2 = ''.join(rng.choice(list('abcd'), size=rng.integers(0, 12)))
+        assert fn(s1, s2) == edit_distance.levenshtein_wagner_fischer(s1, s2)
+
+
+def test_levenshtein_long_strings():
+    # Distances past 127 used to wrap around in an int8 matrix
+    s1, s2 = 'a' * 300, 'b' * 200
+    assert edit_distance.levenshtein_wagner_fischer(s1, s2) == 300
+    assert edit_distance.levenshtein_myers(s1, s2) == 300
+    assert edit_distance.levenshtein_two_row(s1, s2) == 300
+
+
+@pytest.mark.parametrize('s1,s2,k,expect', [
+    ('kitten', 'sitting', 3, 3),
+    ('kitten', 'sitting', 2, None),
+    ('abc', 'abcdef', 2, None),  # Length difference alone exceeds k
+    ('prefix_abc_suffix', 'prefix_xbc_suffix', 1, 1),
+    ('', '', 0, 0),
+    ('same', 'same', 0, 0),
+])
+def test_levenshtein_within(s1, s2, k, expect):
+    assert edit_distance.levenshtein_within(s1, s2, k) == expect
+    assert edit_distance.levenshtein_within(s2, s1, k) == expect
+
+
+def test_levenshtein_within_random():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        s1 = ''.join(rng.choice(list('abc'), size=rng.integers(0, 12)))
+        s2 = ''.join(rng.choice(list('abc'), size=rng.integers(0, 12)))
+        k = int(rng.integers(0, 8))
+        distance = edit_distance.levenshtein_wagner_fischer(s1, s2)
+        assert edit_distance.levenshtein_within(s1, s2, k) == (distance if distance <= k else None)
+
+
+@pytest.mark.parametrize('s1,s2,k,expect', [
+    ('karolin', 'kathrin', 3, 3),
+    ('karolin', 'kathrin', 2, None),
+    ('abc', 'abc', 0, 0),
+])
+def test_hamming_within(s1, s2, k, expect):
+    assert edit_distance.hamming_within(s1, s2, k) == expect
+
+
+def test_lcs_long_strings():
+    # Lengths past 127 used to wrap around in an int8 matrix
+    assert edit_distance.lcs('a' * 300, 'a' * 200) == 200
+
+
+@pytest.mark.parametrize('fn', [edit_distance.lcs_bit_parallel, edit_distance.lcs_hunt_szymanski])
+def test_lcs_fast(fn):
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        s1 = ''.join(rng.choice(list('abcd'), size=rng.integers(0, 15)))
+        s2 = ''.join(rng.choice(list('abcd'), size=rng.integers(0, 15)))
+        assert fn(s1, s2) == edit_distance.lcs(s1, s2, backend='python')
+    assert fn(['the', 'cat', 'sat'], ['a', 'cat', 'sat', 'down']) == 2
+
+
+def test_lcs_hirschberg():
+    assert edit_distance.lcs_hirschberg('AGGTAB', 'GXTXAYB')[0] == 'GTAB'
+    assert edit_distance.lcs_hirschberg([1, 2, 3], [3, 2, 1, 2]) == ([1, 2], [(0, 2), (1, 3)])
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        s1 = ''.join(rng.choice(list('abcd'), size=rng.integers(0, 15)))
+        s2 = ''.join(rng.choice(list('abcd'), size=rng.integers(0, 15)))
+        subsequence, pairs = edit_distance.lcs_hirschberg(s1, s2)
+        assert len(subsequence) == edit_distance.lcs(s1, s2, backend='python')
+        assert subsequence == ''.join(s1[i] for i, _ in pairs) == ''.join(s2[j] for _, j in pairs)
+        assert all(i < k and j < l for (i, j), (k, l) in zip(pairs, pairs[1:]))
+
+
+@pytest.mark.parametrize('index_cls', [fuzzy_index.BKTree, fuzzy_index.TrieIndex])
+def test_fuzzy_index(index_cls, tmp_path):
+    rng = np.random.default_rng(0)
+    words = [''.join(rng.choice(list('abcde'), size=rng.integers(1, 7))) for _ in range(500)]
+    vocabulary = sorted(set(words))
+    index = index_cls.build(words)
+    assert len(index) == len(vocabulary)
+
+    index.save(tmp_path / 'index.json')
+    loaded = index_cls.load(tmp_path / 'index.json')
+    for query in ['abc', 'eeeee', 'bad', '', 'abcdefg']:
+        distances = sorted((edit_distance.levenshtein_myers(query, w), w) for w in vocabulary)
+        expect = [(d, w) for d, w in distances if d <= 2]
+        assert index.search(query, 2) == expect
+        assert loaded.search(query, 2) == expect
+        assert index.last_stats['visited'] <= index.last_stats['nodes']
+        assert [d for d, _ in index.nearest(query, 5)] == [d for d, _ in distances[:5]]
+
+
+@pytest.mark.parametrize('s1,s2,expect', [
+    ('MARTHA', 'MARHTA', 0.961),
+    ('DWAYNE', 'DUANE', 0.84),
+    ('DIXON', 'DICKSONX', 0.813),
+    ('abc', 'xyz', 0.0),
+    ('', '', 1.0),
+    ('a', 'a', 1.0),
+])
+def test_jaro_winkler(s1, s2, expect):
+    assert edit_distance.jaro_winkler(s1, s2) == pytest.approx(expect, abs=1e-3)
+
+
+@pytest.mark.parametrize('s1,s2,osa,expect', [
+    ('ca', 'abc', 3, 2),  # OSA may not edit the transposed pair again
+    ('abcdef', 'abcfad', 3, 3),
+    ('ab', 'ba', 1, 1),
+    ('kitten', 'sitting', 3, 3),
+    ('', 'abc', 3, 3),
+])
+def test_damerau_levenshtein(s1, s2, osa, expect):
+    assert edit_distance.damerau_levenshtein_osa(s1, s2) == osa
+    assert edit_distance.damerau_levenshtein(s1, s2) == expect
+    assert edit_distance.damerau_levenshtein(s2, s1) == expect
+
+
+def test_damerau_levenshtein_bounds():
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        s1 = ''.join(rng.choice(list('abc'), size=rng.integers(0, 9)))
+        s2 = ''.join(rng.choice(list('abc'), size=rng.integers(0, 9)))
+        levenshtein = edit_distance.levenshtein_two_row(s1, s2)
+        osa = edit_distance.damerau_levenshtein_osa(s1, s2)
+        assert edit_distance.damerau_levenshtein(s1, s2) <= osa <= levenshtein
+        assert edit_distance.score_many(s1, [s2], 'damerau_levenshtein_osa') == [osa]
+
+
+@pytest.mark.parametrize('metric,fn', [
+    ('levenshtein', edit_distance.levenshtein_myers),
+    ('damerau_levenshtein', edit_distance.damerau_levenshtein),
+    ('damerau_levenshtein_osa', edit_distance.damerau_levenshtein_osa),
+    ('jaro', edit_distance.jaro),
+    ('jaro_winkler', edit_distance.jaro_winkler),
+])
+def test_score_many(metric, fn):
+    candidates = ['MARHTA', 'MARTHA', '', 'ARTHUR', 'MATHRA']
+    assert edit_distance.score_many('MARTHA', candidates, metric) == [fn('MARTHA', c) for c in candidates]
+
+
+def _random_words(rng, n, max_length, alphabet='abc'):
+    return [''.join(rng.choice(list(alphabet), size=rng.integers(0, max_length + 1))) for _ in range(n)]
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+@pytest.mark.parametrize('metric,reference', [
+    ('levenshtein', edit_distance.levenshtein_two_row),
+    ('lcs', lambda s1, s2: edit_distance.lcs(s1, s2, backend='python')),
+])
+def test_pairwise(metric, reference, n_jobs):
+    rng = np.random.default_rng(0)
+    a, b = _random_words(rng, 23, 9), _random_words(rng, 17, 9)
+    for strings_b in [None, b]:
+        others = a if strings_b is None else b
+        result = pairwise.pairwise(a, strings_b, metric=metric, n_jobs=n_jobs, tile_size=5)
+        assert result.tolist() == [[reference(s1, s2) for s2 in others] for s1 in a]
+
+
+def test_pairwise_hamming(tmp_path):
+    rng = np.random.default_rng(0)
+    strings = [''.join(rng.choice(list('ab'), size=6)) for _ in range(13)]
+    expect = [[edit_distance.hamming(s1, s2) for s2 in strings] for s1 in strings]
+    assert pairwise.pairwise(strings, metric='hamming', tile_size=4).tolist() == expect
+    result = pairwise.pairwise(strings, metric='hamming', n_jobs=2, tile_size=4, out=tmp_path / 'out.npy')
+    assert np.load(tmp_path / 'out.npy').tolist() == result.tolist() == expect
+    with pytest.raises(ValueError):
+        pairwise.pairwise(['ab', 'abc'], metric='hamming')
+    with pytest.raises(ValueError):  # A sparse result has nothing to write into out
+        pairwise.pairwise(strings, metric='hamming', threshold=1, out=tmp_path / 'sparse.npy')
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+@pytest.mark.parametrize('threshold', [1, 3])
+@pytest.mark.parametrize('metric', ['levenshtein', 'hamming'])
+def test_pairwise_threshold(metric, threshold, n_jobs):
+    rng = np.random.default_rng(0)
+    if metric == 'hamming':
+        a = [''.join(rng.choice(list('ab'), size=5)) for _ in range(20)]
+        b = [''.join(rng.choice(list('ab'), size=5)) for _ in range(11)]
+    else:
+        a, b = _random_words(rng, 20, 8), _random_words(rng, 11, 8)
+    dense = pairwise.pairwise(a, b, metric=metric)
+    rows, cols, distances = pairwise.pairwise(a, b, metric=metric, threshold=threshold, n_jobs=n_jobs, tile_size=4)
+    assert list(zip(rows.tolist(), cols.tolist())) == list(zip(*np.nonzero(dense <= threshold)))
+    assert distances.tolist() == dense[rows, cols].tolist()
+
+    # Against itself, each pair is only reported once
+    dense = pairwise.pairwise(a, metric=metric)
+    rows, cols, distances = pairwise.pairwise(a, metric=metric, threshold=threshold, n_jobs=n_jobs, tile_size=4)
+    assert list(zip(rows.tolist(), cols.tolist())) == list(zip(*np.nonzero(np.triu(dense <= threshold, 1))))
+    assert distances.tolist() == dense[rows, cols].tolist()
+
+
+@pytest.mark.parametrize('size', [1, 8, 20])
+@pytest.mark.parametrize('backend_name', ['python', 'numpy'])
+def test_packed_hamming(size, backend_name):
+    rng = np.random.default_rng(0)
+    database = rng.integers(0, 256, size=(300, size), dtype=np.uint8)
+    queries = rng.integers(0, 256, size=(4, size), dtype=np.uint8)
+    bits, query_bits = np.unpackbits(database, axis=1), np.unpackbits(queries, axis=1)
+    expect = [[edit_distance.hamming(q.tolist(), f.tolist()) for f in bits] for q in query_bits]
+
+    matrix = packed_hamming.distance_matrix(queries, database, backend=backend_name)
+    assert np.asarray(matrix).tolist() == expect
+    # Same fingerprints, as bytes and as unpacked bits
+    as_bytes = [f.tobytes() for f in database]
+    assert np.asarray(packed_hamming.distances(queries[0].tobytes(), as_bytes, backend=backend_name)).tolist() == expect[0]
+    assert packed_hamming.distance_matrix(query_bits.astype(bool), bits.astype(bool)).tolist() == expect
+
+    indices, distances = packed_hamming.top_k(queries, database, k=5, backend=backend_name)
+    for row, idx, dist in zip(expect, np.asarray(indices).tolist(), np.asarray(distances).tolist()):
+        assert list(zip(dist, idx)) == sorted((d, i) for i, d in enumerate(row))[:5]
+
+
+def test_packed_hamming_top_k_blocks(monkeypatch):
+    # Small blocks, so the running top k is merged across many of them
+    monkeypatch.setattr(packed_hamming, '_BLOCK', 64)
+    rng = np.random.default_rng(0)
+    database = [int(x) for x in rng.integers(0, 2**16, size=500)]
+    queries = database[:3]
+    indices, distances = packed_hamming.top_k(queries, database, k=7)
+    for q, idx, dist in zip(queries, indices.tolist(), distances.tolist()):
+        assert list(zip(dist, idx)) == sorted(((q ^ f).bit_count(), i) for i, f in enumerate(database))[:7]
+    assert packed_hamming.top_k(queries, database, k=1000)[0].shape == (3, 500)
+    with pytest.raises(ValueError):
+        packed_hamming.distances(b'ab', [b'abcdefghij'])